@@ -3,11 +3,20 @@ import streamlit as st
 import pandas as pd
 import asyncio
 import io
+import os
 import sitemap_parser
 import importlib
 importlib.reload(sitemap_parser) # Force reload on every run to fix caching issues
-from sitemap_parser import parse_uploaded_file, parse_sitemap, fetch_sitemap_content, extract_urls_recursive
-from seo_analyzer import analyze_urls
+from sitemap_parser import parse_uploaded_file, aiter_sitemap_batches, SitemapFrontier, DEFAULT_CONCURRENCY, MAX_DECOMPRESSED_BYTES, SitemapTooLargeError
+from sitemap_cache import SitemapCache, DEFAULT_CACHE_PATH
+from url_store import UrlStore
+from crawl_checkpoint import CrawlCheckpoint, DEFAULT_CHECKPOINT_PATH
+from url_dedup import make_dedup, DEFAULT_ERROR_RATE
+from http_pool import DEFAULT_MAX_PER_HOST, create_async_session
+from sitemap_discovery import discover_sitemaps_async
+from seo_analyzer import analyze_urls, analyze_url_stream, TIMING_COLUMNS
+from retry_policy import DEFAULT_MAX_ATTEMPTS
+from seo_cache import SeoResultCache, DEFAULT_SEO_CACHE_PATH, DEFAULT_RESULT_TTL
 from curl_cffi.requests import RequestsError # For error handling context
 
 # Set page config
@@ -49,9 +58,38 @@ st.title("🔗 Sitemap URL Extractor & SEO Analyzer")
 
 # Sidebar
 st.sidebar.header("Configuration")
-mode = st.sidebar.radio("Input Mode", ["Upload XML File", "Enter Sitemap URL"])
+mode = st.sidebar.radio("Input Mode", ["Upload XML File", "Enter Sitemap URL", "Discover from Domain"])
 limit_urls = st.sidebar.number_input("Limit URLs", value=1000000, step=10000)
+sitemap_max_per_host = st.sidebar.number_input("Sitemap Connections Per Host", min_value=1, max_value=50, value=DEFAULT_MAX_PER_HOST, help="Open connections per host; requests beyond this share kept-alive (HTTP/2) connections.")
+max_sitemap_mb = st.sidebar.number_input("Max Sitemap Size (MB)", min_value=1, value=MAX_DECOMPRESSED_BYTES // (1024 * 1024), help="Decompressed size cap per sitemap file. Larger files are skipped with an error.")
+sitemap_concurrency = st.sidebar.number_input("Sitemap Fetch Concurrency", min_value=1, max_value=100, value=DEFAULT_CONCURRENCY, help="How many child sitemaps are downloaded in parallel.")
+DEDUP_LABELS = {"Exact (memory)": "exact", "Bloom filter (approximate)": "bloom", "Exact (disk, SQLite)": "disk"}
+dedup_label = st.sidebar.selectbox("URL Dedup Mode", list(DEDUP_LABELS), help="Bloom filter and disk modes keep dedup memory bounded for multi-million URL crawls.")
+dedup_mode = DEDUP_LABELS[dedup_label]
+bloom_error_rate = DEFAULT_ERROR_RATE
+if dedup_mode == "bloom":
+    bloom_error_rate = st.sidebar.number_input("Bloom False-Positive Rate", min_value=0.000001, max_value=0.1, value=DEFAULT_ERROR_RATE, format="%.6f", help="Share of new URLs that may be wrongly dropped as duplicates.")
+use_sitemap_cache = st.sidebar.checkbox("Cache Sitemaps Between Runs", value=False, help="Store parsed sitemaps on disk and revalidate them with conditional requests (ETag / Last-Modified) on the next crawl.")
+skip_unchanged_sitemaps = st.sidebar.checkbox("Skip Unchanged Sitemaps", value=False, disabled=not use_sitemap_cache, help="Reuse stored URLs for child sitemaps whose <lastmod> in the index has not changed since the last crawl.")
+use_checkpoint = st.sidebar.checkbox("Checkpoint Crawl (Resumable)", value=False, help="Save crawl progress to disk while crawling, so an interrupted crawl can be resumed with 'Resume Last Crawl'.")
 do_seo = st.sidebar.checkbox("Perform SEO Analysis", value=False, help="Check status codes, canonicals, noindex.")
+parse_processes = st.sidebar.number_input("HTML Parse Processes", min_value=0, max_value=os.cpu_count() or 1, value=0, disabled=not do_seo, help="Scan page heads in this many worker processes so parsing does not slow down fetching. 0 parses in the fetch loop.")
+check_html = st.sidebar.checkbox("Check Canonical & Meta Robots", value=True, disabled=not do_seo, help="Read each page's <head> for canonical, meta robots, title and hreflang. Off: status codes, redirects and X-Robots-Tag only, without downloading page bodies.")
+head_first = st.sidebar.checkbox("HEAD Requests First", value=False, disabled=not do_seo, help="Send HEAD requests and only GET pages that are 200 HTML and still need their head checked. Servers that mishandle HEAD are retried with GET.")
+max_redirects = st.sidebar.number_input("Follow Redirects (Max Hops)", min_value=0, max_value=30, value=0, disabled=not do_seo, help="Follow redirect chains to their final status, up to this many hops. Each redirect hop is requested once per run. 0 records only the first Location.")
+max_attempts = st.sidebar.number_input("Max Attempts Per URL", min_value=1, max_value=10, value=DEFAULT_MAX_ATTEMPTS, disabled=not do_seo, help="Timeouts, connection errors, 429 and 5xx responses are retried with jittered exponential backoff (honouring Retry-After), within a per-host retry budget. DNS, TLS and other 4xx errors are not retried.")
+use_seo_cache = st.sidebar.checkbox("Cache SEO Results Between Runs", value=False, disabled=not do_seo, help="Store each URL's result on disk. URLs checked within the TTL are not requested again; older ones are revalidated with conditional requests (ETag / Last-Modified).")
+seo_cache_ttl_hours = st.sidebar.number_input("SEO Result TTL (hours)", min_value=0.0, value=DEFAULT_RESULT_TTL / 3600, step=1.0, disabled=not (do_seo and use_seo_cache), help="0 always revalidates.")
+
+@st.cache_resource
+def get_seo_cache():
+    # One shared connection for all sessions; SeoResultCache serialises access itself
+    return SeoResultCache(DEFAULT_SEO_CACHE_PATH)
+
+analysis_options = {'parse_processes': parse_processes, 'head_first': head_first, 'check_html': check_html, 'max_redirects': max_redirects, 'max_attempts': max_attempts}
+if use_seo_cache:
+    analysis_options.update(cache=get_seo_cache(), cache_ttl=seo_cache_ttl_hours * 3600)
+pipeline_seo = st.sidebar.checkbox("Analyze While Crawling", value=True, disabled=not do_seo, help="Start SEO checks on URLs from the first sitemaps while later sitemaps are still downloading (URL mode).")
 
 if st.sidebar.button("Clear Results"):
     st.session_state.df_results = None
@@ -68,17 +106,94 @@ if st.sidebar.button("Clear Results"):
 def stop_callback():
     return st.session_state.get("stop_pressed", False)
 
+# Streams URL batches from the crawler so counts update while child sitemaps download.
+# With a progress placeholder, discovered URLs are analyzed in the same pass (pipelined).
+# With resume, an unfinished checkpointed crawl of url_source is continued instead of restarted.
+# With discover, url_source is a domain whose sitemap roots (robots.txt, common paths) are crawled together.
+async def collect_sitemap_urls(url_source, status_placeholder, progress_placeholder=None, resume=False, discover=False):
+    urls_data = UrlStore()
+    found_sitemaps = []
+    errors = []
+    
+    frontier = SitemapFrontier()
+    
+    async def crawl():
+        cache = SitemapCache(DEFAULT_CACHE_PATH) if use_sitemap_cache else None
+        dedup = make_dedup(dedup_mode, capacity=limit_urls, error_rate=bloom_error_rate)
+        checkpoint = CrawlCheckpoint(DEFAULT_CHECKPOINT_PATH) if use_checkpoint or resume else None
+        # One pool for discovery and every sitemap root
+        session = create_async_session(max_clients=sitemap_concurrency, max_per_host=sitemap_max_per_host)
+        try:
+            roots = url_source
+            if discover:
+                status_placeholder.text(f"Discovering sitemaps for {url_source}...")
+                roots, discovery_errors = await discover_sitemaps_async(url_source, session)
+                errors.extend(discovery_errors)
+                if not roots:
+                    return
+            if checkpoint is not None:
+                if resume and checkpoint.can_resume(roots):
+                    # URLs collected before the interruption come first
+                    restored = list(checkpoint.iter_records())
+                    urls_data.extend(restored)
+                    if restored:
+                        yield restored
+                else:
+                    checkpoint.clear()
+            async for batch in aiter_sitemap_batches(
+                roots,
+                max_urls=limit_urls,
+                should_stop=stop_callback,
+                concurrency=sitemap_concurrency,
+                processed_sitemaps=found_sitemaps,
+                errors=errors,
+                max_sitemap_bytes=max_sitemap_mb * 1024 * 1024,
+                cache=cache,
+                incremental=use_sitemap_cache and skip_unchanged_sitemaps,
+                frontier=frontier,
+                dedup=dedup,
+                session=session,
+                checkpoint=checkpoint
+            ):
+                urls_data.extend(batch)
+                status_placeholder.text(
+                    f"Found {len(urls_data)} URLs in {len(found_sitemaps)} sitemaps "
+                    f"({len(frontier)} of {frontier.discovered} sitemaps still queued)..."
+                )
+                yield batch
+        finally:
+            dedup.close()
+            if cache is not None:
+                cache.close()
+            if checkpoint is not None:
+                checkpoint.close()
+            await session.close()
+    
+    if progress_placeholder is None:
+        async for _ in crawl():
+            pass
+        return urls_data, found_sitemaps, errors, None
+    
+    async def discovered_urls():
+        async for batch in crawl():
+            for item in batch:
+                yield item['sitemap_url']
+    
+    analyzed_data = await analyze_url_stream(discovered_urls(), lambda p: progress_placeholder.progress(p), stop_callback, **analysis_options)
+    return urls_data, found_sitemaps, errors, analyzed_data
+
 # Processing Logic
-def run_processing(url_source, is_upload=False):
+def run_processing(url_source, is_upload=False, resume=False, discover=False):
     st.session_state.processing_done = False
     st.session_state.df_results = None
     st.session_state.processed_sitemaps = []
     st.session_state.page_number = 0
     st.session_state.stop_pressed = False
     
-    urls_data = [] # List of dicts
+    urls_data = UrlStore() # Compact columnar records
     found_sitemaps = []
     errors = []
+    analyzed_data = None # Filled during extraction in pipelined mode
     
     # Placeholder for Stop Button during processing
     stop_placeholder = st.empty()
@@ -88,51 +203,58 @@ def run_processing(url_source, is_upload=False):
     
     with st.spinner("Extracting URLs..."):
         if is_upload:
+            # Simple dedup by url (first file wins)
+            dedup = make_dedup(dedup_mode, capacity=limit_urls, error_rate=bloom_error_rate)
             for f in url_source:
-                if stop_callback(): break
+                if stop_callback() or len(urls_data) >= limit_urls: break
                 f.seek(0)
                 # parse_uploaded_file now returns list of dicts
-                file_urls_data = parse_uploaded_file(f.read(), f.name)
-                urls_data.extend(file_urls_data)
-                
-            # Deduplicate logic for upload if needed, or trust parser
-            # Simple dedup by url
-            unique_urls = {}
-            for item in urls_data:
-                 unique_urls[item['sitemap_url']] = item
-            urls_data = list(unique_urls.values())
+                try:
+                    file_urls_data = parse_uploaded_file(f.read(), f.name, max_bytes=max_sitemap_mb * 1024 * 1024)
+                except SitemapTooLargeError as e:
+                    errors.append(f"Error parsing {f.name}: {e}")
+                    continue
+                for item in file_urls_data:
+                    if len(urls_data) < limit_urls and dedup.add(item['sitemap_url']):
+                        urls_data.append(item['sitemap_url'], item['source_sitemap'], item)
+            dedup.close()
             
             found_sitemaps = [f.name for f in url_source]
         else:
             # fetch content to validate
-            # extract_urls_recursive returns list of dicts now
-            urls_data, found_sitemaps, errors = extract_urls_recursive(
-                url_source, 
-                max_urls=limit_urls, 
-                should_stop=stop_callback
-            )
+            # batches are list of dicts {'sitemap_url', 'source_sitemap'}
+            status_placeholder = st.empty()
+            progress_placeholder = st.empty() if do_seo and pipeline_seo else None
+            try:
+                urls_data, found_sitemaps, errors, analyzed_data = asyncio.run(
+                    collect_sitemap_urls(url_source, status_placeholder, progress_placeholder, resume, discover)
+                )
+            except Exception as e:
+                st.error(f"Error during extraction: {e}")
+            status_placeholder.empty()
             
     # Check if stopped
     if st.session_state.stop_pressed:
         st.warning("Processing stopped by user. Showing partial results.")
     
     stop_placeholder.empty() # Remove button
-
-    urls_data = urls_data[:limit_urls]
     
     if errors:
         with st.expander("⚠️ Extraction Warnings/Errors", expanded=True):
             for e in errors:
                 st.error(e)
 
-    if not urls_data:
+    if not len(urls_data):
         st.warning("No URLs found.")
         return
 
-    # Create DF from list of dicts (automatically keys: sitemap_url, source_sitemap)
-    df = pd.DataFrame(urls_data)
+    # Columnar store -> DF (sitemap_url, categorical source_sitemap)
+    df = urls_data.to_dataframe()
     
-    if do_seo and not st.session_state.stop_pressed:
+    if analyzed_data:
+        # Pipelined mode: analysis already ran alongside extraction
+        df = pd.merge(df, pd.DataFrame(analyzed_data), on='sitemap_url', how='left')
+    elif do_seo and analyzed_data is None and not st.session_state.stop_pressed:
         st.info(f"Starting SEO Analysis for {len(df)} URLs...")
         
         # Show Stop Button again for Analysis phase
@@ -146,7 +268,7 @@ def run_processing(url_source, is_upload=False):
         target_urls = df['sitemap_url'].tolist()
         
         try:
-            analyzed_data = asyncio.run(analyze_urls(target_urls, lambda p: placeholder.progress(p), stop_callback))
+            analyzed_data = asyncio.run(analyze_urls(target_urls, lambda p: placeholder.progress(p), stop_callback, **analysis_options))
             
             if st.session_state.stop_pressed:
                 st.warning("Analysis stopped. Merging partial results.")
@@ -172,7 +294,8 @@ def run_processing(url_source, is_upload=False):
 
 # Helper for Late/Re-Analysis
 # Helper for Late/Re-Analysis
-def update_analysis(target_urls):
+def update_analysis(target_urls, revalidate=False):
+    # revalidate: an explicit re-check, so cached results are revalidated rather than reused
     if not target_urls:
          st.warning("No URLs selected to analyze.")
          return
@@ -187,7 +310,10 @@ def update_analysis(target_urls):
     
     placeholder = st.empty()
     try:
-        new_results = asyncio.run(analyze_urls(target_urls, lambda p: placeholder.progress(p), stop_callback))
+        options = analysis_options
+        if revalidate and 'cache' in options:
+            options = dict(options, cache_ttl=0)
+        new_results = asyncio.run(analyze_urls(target_urls, lambda p: placeholder.progress(p), stop_callback, **options))
         new_df = pd.DataFrame(new_results)
         
         stop_placeholder_re.empty()
@@ -245,6 +371,23 @@ elif mode == "Enter Sitemap URL":
              run_processing(sitemap_url, is_upload=False)
         else:
              st.warning("Enter a URL.")
+    
+    # Offer to continue a checkpointed crawl that was stopped or interrupted
+    if os.path.exists(DEFAULT_CHECKPOINT_PATH):
+        with CrawlCheckpoint(DEFAULT_CHECKPOINT_PATH) as checkpoint:
+            resume_roots = checkpoint.roots if checkpoint.can_resume() else None
+            resume_count = checkpoint.record_count()
+        if resume_roots:
+            roots_label = resume_roots[0] + (f" +{len(resume_roots) - 1} more" if len(resume_roots) > 1 else "")
+            if st.button(f"Resume Last Crawl ({roots_label}, {resume_count} URLs so far)"):
+                run_processing(resume_roots, is_upload=False, resume=True)
+elif mode == "Discover from Domain":
+    domain = st.text_input("Domain", "example.com", help="Sitemaps are read from robots.txt and common locations such as /sitemap.xml, then crawled together.")
+    if st.button("Start Processing"):
+        if domain:
+             run_processing(domain, is_upload=False, discover=True)
+        else:
+             st.warning("Enter a domain.")
 
 # RESULTS SECTION
 if st.session_state.processing_done and st.session_state.df_results is not None:
@@ -325,6 +468,20 @@ if st.session_state.processing_done and st.session_state.df_results is not None:
         err_cnt = len(orig_df[orig_df['final_status'] >= 400])
         m5.metric("Errors", err_cnt)
 
+        timing_cols = [c for c in TIMING_COLUMNS + ('bytes_received',) if c in orig_df.columns]
+        timings = orig_df[timing_cols].apply(pd.to_numeric, errors='coerce')
+        if len(timing_cols) == len(TIMING_COLUMNS) + 1 and timings['total_ms'].notna().any():
+            t1, t2, t3, t4 = st.columns(4)
+            t1.metric("TTFB p50", f"{timings['ttfb_ms'].median():.0f} ms")
+            t2.metric("TTFB p95", f"{timings['ttfb_ms'].quantile(0.95):.0f} ms")
+            t3.metric("Total p50", f"{timings['total_ms'].median():.0f} ms")
+            t4.metric("Total p95", f"{timings['total_ms'].quantile(0.95):.0f} ms")
+            with st.expander("⏱️ Timing Percentiles"):
+                percentiles = timings.quantile([0.5, 0.75, 0.9, 0.95, 0.99]).round(1)
+                percentiles.index = ["p50", "p75", "p90", "p95", "p99"]
+                percentiles.loc["max"] = timings.max()
+                st.dataframe(percentiles, use_container_width=True)
+
 
     st.caption(f"Showing {filtered_count} URLs in current view")
     
@@ -344,10 +501,35 @@ if st.session_state.processing_done and st.session_state.df_results is not None:
     column_config = {
         "sitemap_url": st.column_config.LinkColumn("URL"),
         "source_sitemap": st.column_config.TextColumn("Source Sitemap", width="medium"),
+        "lastmod": st.column_config.DatetimeColumn("Last Modified", format="YYYY-MM-DD HH:mm"),
+        "changefreq": st.column_config.TextColumn("Change Freq", width="small"),
+        "priority": st.column_config.NumberColumn("Priority", format="%.1f", width="small"),
+        "hreflang": st.column_config.TextColumn("Hreflang Alternates"),
+        "images": st.column_config.TextColumn("Images"),
+        "video_urls": st.column_config.TextColumn("Videos"),
+        "video_titles": st.column_config.TextColumn("Video Titles"),
+        "news_title": st.column_config.TextColumn("News Title"),
+        "news_publication_date": st.column_config.TextColumn("News Published"),
+        "news_name": st.column_config.TextColumn("News Publication"),
         "Status Icon": st.column_config.CheckboxColumn("Status OK", width="small"),
         "final_status": st.column_config.NumberColumn("Code", format="%d"),
         "canonical_match": st.column_config.CheckboxColumn("Canonical Match", width="small"),
         "noindex": st.column_config.CheckboxColumn("Noindex", width="small"),
+        "title": st.column_config.TextColumn("Page Title"),
+        "page_hreflang": st.column_config.TextColumn("Page Hreflang"),
+        "redirect_chain": st.column_config.TextColumn("Redirect Chain"),
+        "redirect_hops": st.column_config.NumberColumn("Hops", format="%d", width="small"),
+        "redirect_final_url": st.column_config.LinkColumn("Final URL"),
+        "redirect_final_status": st.column_config.NumberColumn("Final Code", format="%d", width="small"),
+        "error_type": st.column_config.TextColumn("Error Type", width="small"),
+        "attempts": st.column_config.NumberColumn("Attempts", format="%d", width="small"),
+        "dns_ms": st.column_config.NumberColumn("DNS (ms)", format="%.1f", width="small"),
+        "connect_ms": st.column_config.NumberColumn("Connect (ms)", format="%.1f", width="small"),
+        "tls_ms": st.column_config.NumberColumn("TLS (ms)", format="%.1f", width="small"),
+        "ttfb_ms": st.column_config.NumberColumn("TTFB (ms)", format="%.1f", width="small"),
+        "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.1f", width="small"),
+        "bytes_received": st.column_config.NumberColumn("Bytes", format="%d", width="small"),
+        "cache_status": st.column_config.TextColumn("Cache", width="small"),
     }
     
     # Pagination Logic
@@ -377,7 +559,7 @@ if st.session_state.processing_done and st.session_state.df_results is not None:
     if selected_urls:
          st.info(f"Selected {len(selected_urls)} URLs")
          if st.button("Re-Analyze Selected URLs"):
-             update_analysis(selected_urls)
+             update_analysis(selected_urls, revalidate=True)
 
     # 5. Smart Pagination (Bottom, Right-Aligned)
     st.divider()
@@ -460,7 +642,11 @@ if st.session_state.processing_done and st.session_state.df_results is not None:
         st.download_button("Download CSV", csv, "sitemap_analysis.csv", "text/csv")
     with d2:
         buffer = io.BytesIO()
+        excel_df = export_df.copy()
+        if "lastmod" in excel_df.columns:
+            # Excel has no timezone-aware datetimes; lastmod is stored in UTC
+            excel_df['lastmod'] = excel_df['lastmod'].dt.tz_localize(None)
         with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            export_df.to_excel(writer, index=False, sheet_name='Sheet1')
+            excel_df.to_excel(writer, index=False, sheet_name='Sheet1')
         st.download_button("Download Excel", buffer.getvalue(), "sitemap_analysis.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+
+DEFAULT_CHECKPOINT_PATH = ".crawl_checkpoint.sqlite3"
+DEFAULT_CHECKPOINT_EVERY = 20  # Sitemaps processed between checkpoint writes
+
+class CrawlCheckpoint:
+    """
+    SQLite file holding the state of one sitemap crawl so it can be resumed.
+
+    It stores the root sitemap URL(s), the pending frontier (including sitemaps that were in
+    flight), the processed sitemaps, the errors and every URL record collected so
+    far. Processed sitemaps, errors and records are append-only, so each save only
+    writes what is new since the previous one.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS frontier (pos INTEGER PRIMARY KEY, url TEXT NOT NULL, lastmod TEXT);
+                CREATE TABLE IF NOT EXISTS processed (pos INTEGER PRIMARY KEY, url TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS errors (pos INTEGER PRIMARY KEY, message TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS records (pos INTEGER PRIMARY KEY, url TEXT NOT NULL, source TEXT NOT NULL, details TEXT);
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+            if 'details' not in columns:
+                # Checkpoints written before per-URL fields were extracted
+                self._conn.execute("ALTER TABLE records ADD COLUMN details TEXT")
+        self._saved_processed = self._count('processed')
+        self._saved_errors = self._count('errors')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _count(self, table):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def roots(self):
+        """Root sitemap URLs of the checkpointed crawl, or None for an empty file."""
+        value = self._meta('root')
+        if value is None:
+            return None
+        try:
+            roots = json.loads(value)
+        except ValueError:
+            roots = value # Single plain-text root from older checkpoints
+        return _as_roots(roots)
+
+    @property
+    def finished(self):
+        return self._meta('finished') == '1'
+
+    def can_resume(self, roots=None):
+        """True if there is an unfinished crawl (of `roots`, a URL or list, if given) to continue."""
+        saved = self.roots
+        return saved is not None and not self.finished and (roots is None or saved == _as_roots(roots))
+
+    def clear(self):
+        """Drop any saved crawl, so the next checkpointed crawl starts fresh."""
+        with self._lock, self._conn:
+            for table in ('meta', 'frontier', 'processed', 'errors', 'records'):
+                self._conn.execute(f"DELETE FROM {table}")
+        self._saved_processed = 0
+        self._saved_errors = 0
+
+    def reset(self, roots):
+        """Drop any previous state and start checkpointing a new crawl of `roots` (a URL or list)."""
+        self.clear()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('root', ?), ('finished', '0')", (json.dumps(_as_roots(roots)),)
+            )
+
+    def save(self, pending, processed_sitemaps, errors, new_records, finished=False):
+        """
+        Persist the crawl state.
+
+        `pending` is the full list of (sitemap_url, lastmod) still to crawl, in order.
+        `processed_sitemaps` / `errors` are the crawl's complete lists; `new_records`
+        are only the URL records collected since the previous save.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.executemany("INSERT INTO frontier (url, lastmod) VALUES (?, ?)", pending)
+            self._conn.executemany(
+                "INSERT INTO processed (url) VALUES (?)",
+                ((u,) for u in processed_sitemaps[self._saved_processed:]),
+            )
+            self._conn.executemany(
+                "INSERT INTO errors (message) VALUES (?)", ((e,) for e in errors[self._saved_errors:])
+            )
+            self._conn.executemany(
+                "INSERT INTO records (url, source, details) VALUES (?, ?, ?)",
+                ((r['sitemap_url'], r['source_sitemap'], _dump_details(r)) for r in new_records),
+            )
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'finished'", ('1' if finished else '0',))
+        self._saved_processed = len(processed_sitemaps)
+        self._saved_errors = len(errors)
+
+    def pending(self):
+        return self._conn.execute("SELECT url, lastmod FROM frontier ORDER BY pos").fetchall()
+
+    def processed_sitemaps(self):
+        return [row[0] for row in self._conn.execute("SELECT url FROM processed ORDER BY pos")]
+
+    def errors(self):
+        return [row[0] for row in self._conn.execute("SELECT message FROM errors ORDER BY pos")]
+
+    def record_count(self):
+        return self._count('records')
+
+    def iter_records(self):
+        """Yield the collected URL records in crawl order."""
+        for url, source, details in self._conn.execute("SELECT url, source, details FROM records ORDER BY pos"):
+            record = {'sitemap_url': url, 'source_sitemap': source}
+            if details:
+                record.update(json.loads(details))
+            yield record
+
+def _as_roots(roots):
+    return [roots] if isinstance(roots, str) else list(roots)
+
+def _dump_details(record):
+    """JSON of a record's optional per-URL fields, or None if it has none."""
+    if len(record) <= 2:
+        return None
+    return json.dumps({k: v for k, v in record.items() if k not in ('sitemap_url', 'source_sitemap')})
@@ -0,0 +1,216 @@
+import asyncio
+import atexit
+import html
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# One pass over the head: comments and raw-text elements are skipped whole, so
+# tags inside them are never mistaken for real <meta>/<link> tags.
+_RAW_TEXT_TAGS = ("script", "style", "noscript", "template", "textarea", "title")
+_TOKEN_RE = re.compile(
+    r'<!--'
+    r'|<(' + '|'.join(_RAW_TEXT_TAGS) + r')\b[^>]*>'
+    r'|<(meta|link)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+    r'|</head\s*>|<body\b',
+    re.IGNORECASE,
+)
+_CLOSE_RES = {name: re.compile(r'</' + name + r'\s*>', re.IGNORECASE) for name in _RAW_TEXT_TAGS}
+_ATTR_RE = re.compile(r'([^\s=/>"\']+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+)))?')
+_DIRECTIVE_SPLIT_RE = re.compile(r'[\s,]+')
+
+ROBOTS_META_NAMES = ("robots", "googlebot")
+PARSE_BATCH_SIZE = 32  # Heads sent to a parse process per task
+PARSE_BATCH_DELAY = 0.005  # Seconds a partial batch waits for more heads
+# Forking a threaded process (Streamlit) can deadlock the child; start workers from a clean server
+PARSE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_executors = {} # processes -> ProcessPoolExecutor shared by all HeadParsePools of that size
+_executors_lock = threading.Lock()
+
+def parse_attributes(text):
+    """Parse a tag's attribute text into a dict (lowercased names, first occurrence wins)."""
+    attrs = {}
+    for match in _ATTR_RE.finditer(text):
+        name = match.group(1).lower()
+        if name not in attrs:
+            value = next((v for v in match.group(2, 3, 4) if v is not None), '')
+            attrs[name] = html.unescape(value)
+    return attrs
+
+def scan_head(document):
+    """
+    Extract the SEO-relevant tags from an HTML document's <head> without building a tree.
+
+    Accepts str or bytes (decoded as UTF-8, ignoring errors) and stops at </head>
+    or <body>. Returns a dict:
+    - 'title': text of the first <title>, whitespace collapsed, or None
+    - 'robots' / 'googlebot': content of every <meta name="robots|googlebot">, in order
+    - 'canonical': href of the first <link> whose rel tokens include "canonical", or None
+    - 'hreflang': [hreflang, href] pairs of <link rel="alternate" hreflang=...>
+    Attribute names, meta names and rel tokens are matched case-insensitively.
+    """
+    if isinstance(document, (bytes, bytearray)):
+        document = document.decode('utf-8', errors='ignore')
+    info = {'title': None, 'robots': [], 'googlebot': [], 'canonical': None, 'hreflang': []}
+    pos = 0
+    while True:
+        match = _TOKEN_RE.search(document, pos)
+        if match is None:
+            break
+        raw_text_tag, tag, attr_text = match.groups()
+        pos = match.end()
+        if raw_text_tag is not None:
+            close = _CLOSE_RES[raw_text_tag.lower()].search(document, pos)
+            if close is None:
+                break # Unterminated: the rest of the head is its text
+            if raw_text_tag.lower() == 'title' and info['title'] is None:
+                info['title'] = ' '.join(html.unescape(document[pos:close.start()]).split())
+            pos = close.end()
+            continue
+        if tag is None:
+            if match.group(0) != '<!--':
+                break # </head> or <body>: the head is over
+            pos = document.find('-->', pos)
+            if pos == -1:
+                break
+            pos += 3
+            continue
+        is_meta = tag.lower() == 'meta'
+        # Most head tags are irrelevant; skip attribute parsing unless a keyword is present
+        lowered = attr_text.lower()
+        if is_meta and 'robots' not in lowered and 'googlebot' not in lowered:
+            continue
+        if not is_meta and 'canonical' not in lowered and 'hreflang' not in lowered:
+            continue
+        attrs = parse_attributes(attr_text)
+        if is_meta:
+            name = attrs.get('name', '').strip().lower()
+            if name in ROBOTS_META_NAMES:
+                info[name].append(attrs.get('content', ''))
+        else:
+            rel = attrs.get('rel', '').lower().split()
+            href = attrs.get('href', '').strip()
+            if not href:
+                continue
+            if 'canonical' in rel and info['canonical'] is None:
+                info['canonical'] = href
+            if 'alternate' in rel and attrs.get('hreflang'):
+                info['hreflang'].append([attrs['hreflang'].strip(), href])
+    return info
+
+def robots_directives(contents):
+    """Lowercased directive tokens of robots meta contents ('noindex, nofollow' -> {'noindex', 'nofollow'})."""
+    directives = set()
+    for content in contents:
+        directives.update(token for token in _DIRECTIVE_SPLIT_RE.split(content.lower()) if token)
+    return directives
+
+def is_noindex(info):
+    """True if any robots or googlebot meta tag carries noindex (or none)."""
+    directives = robots_directives(info['robots'] + info['googlebot'])
+    return 'noindex' in directives or 'none' in directives
+
+def scan_heads(documents):
+    """scan_head over a batch; the unit of work sent to HeadParsePool processes."""
+    return [scan_head(document) for document in documents]
+
+def get_parse_executor(processes=None):
+    """
+    Process pool for head parsing, created once per size and reused by later
+    analyses, so worker start-up is paid once per process rather than per run.
+    """
+    with _executors_lock:
+        executor = _executors.get(processes)
+        if executor is None or getattr(executor, '_broken', False):
+            executor = _executors[processes] = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+            )
+        return executor
+
+@atexit.register
+def shutdown_parse_executors():
+    """Stop the shared parse processes (runs at interpreter exit)."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+class HeadParsePool:
+    """
+    Runs scan_head in worker processes so parsing never blocks the event loop.
+
+    Heads passed to parse() are collected into batches of up to `batch_size` (or
+    whatever arrived within `batch_delay` seconds) and each batch is one task for
+    the process pool, which keeps the pickling/IPC cost per page small. The worker
+    processes come from get_parse_executor and outlive the pool. Use from a
+    single event loop; close() when done.
+    """
+
+    def __init__(self, processes=None, batch_size=PARSE_BATCH_SIZE, batch_delay=PARSE_BATCH_DELAY):
+        self._executor = get_parse_executor(processes)
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+        self._pending = [] # (document, future) not yet sent
+        self._flush_handle = None
+        self._running = set() # Batches sent to the executor
+
+    async def parse(self, document):
+        """Scan one head in the pool. Returns the same dict as scan_head."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((bytes(document), future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        batch = [(document, future) for document, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            task = asyncio.get_running_loop().run_in_executor(
+                self._executor, scan_heads, [document for document, _ in batch]
+            )
+        except Exception as e:
+            # E.g. BrokenProcessPool: fail the batch instead of leaving its callers waiting
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        task.add_done_callback(lambda done: self._resolve(batch, done))
+
+    @staticmethod
+    def _resolve(batch, done):
+        if done.cancelled():
+            for _, future in batch:
+                future.cancel()
+            return
+        error = done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue # Caller was cancelled meanwhile
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def close(self):
+        """Drop queued work and abandon running batches; the shared processes keep running."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        for task in list(self._running):
+            task.cancel()
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import deque
+from urllib.parse import urlparse
+from retry_policy import MAX_RETRY_AFTER
+
+DEFAULT_MAX_TOTAL = 100  # Requests in flight across all hosts
+DEFAULT_INITIAL_PER_HOST = 4  # Starting concurrency for a host we know nothing about
+DEFAULT_MAX_PER_HOST = 16  # Ceiling the additive increase can reach
+DEFAULT_MIN_PER_HOST = 1
+DECREASE_FACTOR = 0.5  # Multiplicative decrease on a congestion signal
+DECREASE_COOLDOWN = 1.0  # Seconds; signals from requests already in flight count once
+BASE_BACKOFF = 0.5  # First pause after a congestion signal, doubled while they continue
+MAX_BACKOFF = 30.0
+
+class _HostState:
+    __slots__ = ('limit', 'active', 'waiters', 'paused_until', 'last_decrease', 'strikes')
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.active = 0
+        self.waiters = deque() # Futures of acquire() calls waiting for a slot
+        self.paused_until = 0.0
+        self.last_decrease = float('-inf')
+        self.strikes = 0 # Consecutive congestion signals
+
+class HostScheduler:
+    """
+    Per-host politeness scheduler with AIMD (additive increase, multiplicative
+    decrease) concurrency limits, like TCP congestion control.
+
+    Every host starts at `initial_per_host` concurrent requests. Each healthy
+    response adds 1/limit, so the limit grows by about one per round of requests up
+    to `max_per_host`. A congestion signal (429/503, timeout) halves it and pauses
+    new requests to that host with exponential backoff. Both count at most once per
+    DECREASE_COOLDOWN, so a burst of signals from requests already in flight is one
+    strike; a Retry-After from the server sets the pause instead. `max_total` caps requests in flight across all hosts, so many small
+    hosts can run side by side while a single host is never hammered.
+
+    Usage: `host = await scheduler.acquire(url)`, then always
+    `scheduler.release(host, congested, retry_after)` once the request finished.
+    """
+
+    def __init__(self, max_total=DEFAULT_MAX_TOTAL, initial_per_host=DEFAULT_INITIAL_PER_HOST,
+                 max_per_host=DEFAULT_MAX_PER_HOST, min_per_host=DEFAULT_MIN_PER_HOST):
+        self.max_total = max(1, max_total)
+        self.initial_per_host = initial_per_host
+        self.max_per_host = max_per_host
+        self.min_per_host = max(1, min_per_host)
+        self._hosts = {}
+        self._active_total = 0
+        self._waiting = {} # Hosts with waiters, in arrival order (dict as ordered set)
+        self._wakeup = None # Timer handle for the earliest paused host
+
+    @property
+    def active(self):
+        return self._active_total
+
+    def limit(self, host):
+        """Current concurrency limit for a host (fractional while growing)."""
+        state = self._hosts.get(host)
+        return state.limit if state else float(self.initial_per_host)
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.initial_per_host)
+        return state
+
+    def _has_room(self, state, now):
+        return state.active < max(self.min_per_host, int(state.limit)) and now >= state.paused_until
+
+    async def acquire(self, url):
+        """Wait for a slot for the URL's host. Returns the host key to pass to release()."""
+        host = urlparse(url).netloc
+        state = self._state(host)
+        if not state.waiters and self._active_total < self.max_total and self._has_room(state, time.monotonic()):
+            self._start(state)
+            return host
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        self._waiting[host] = None
+        self._schedule_wakeup()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled - hand it on untouched
+                state.active -= 1
+                self._active_total -= 1
+                self._dispatch()
+            elif future in state.waiters:
+                state.waiters.remove(future)
+            raise
+        return host
+
+    def release(self, host, congested=False, retry_after=None):
+        """
+        Give the slot back, feeding the request's outcome into the host's limit.
+        `retry_after` (seconds, from a Retry-After header) overrides the backoff pause,
+        capped at retry_policy.MAX_RETRY_AFTER rather than MAX_BACKOFF.
+        """
+        state = self._hosts[host]
+        state.active -= 1
+        self._active_total -= 1
+        now = time.monotonic()
+        if congested:
+            if now - state.last_decrease >= DECREASE_COOLDOWN:
+                state.limit = max(self.min_per_host, state.limit * DECREASE_FACTOR)
+                state.last_decrease = now
+                state.strikes += 1
+            if retry_after is not None:
+                # Same cap as RetryPolicy, so the host stays paused while the URL waits for its retry
+                backoff = min(MAX_RETRY_AFTER, max(0.0, retry_after))
+            else:
+                backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (max(1, state.strikes) - 1))
+            state.paused_until = max(state.paused_until, now + backoff)
+        else:
+            state.strikes = 0
+            state.limit = min(self.max_per_host, state.limit + 1 / state.limit)
+        self._dispatch()
+
+    def _start(self, state):
+        state.active += 1
+        self._active_total += 1
+
+    def _dispatch(self):
+        """Grant free slots to waiting hosts, round robin, skipping full or paused ones."""
+        now = time.monotonic()
+        progress = True
+        while progress and self._waiting and self._active_total < self.max_total:
+            progress = False
+            for host in list(self._waiting):
+                if self._active_total >= self.max_total:
+                    break
+                state = self._hosts[host]
+                while state.waiters and state.waiters[0].done():
+                    state.waiters.popleft() # Cancelled while waiting
+                if not state.waiters:
+                    del self._waiting[host]
+                    continue
+                if self._has_room(state, now):
+                    self._start(state)
+                    state.waiters.popleft().set_result(None)
+                    progress = True
+                    if not state.waiters:
+                        del self._waiting[host]
+        self._schedule_wakeup()
+
+    def _schedule_wakeup(self):
+        """Make sure paused hosts with waiters are looked at again when their pause ends."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        now = time.monotonic()
+        paused = [self._hosts[h].paused_until for h in self._waiting if self._hosts[h].paused_until > now]
+        if paused:
+            loop = asyncio.get_running_loop()
+            self._wakeup = loop.call_later(min(paused) - now, self._dispatch)
@@ -0,0 +1,48 @@
+import threading
+from curl_cffi import CurlHttpVersion, CurlMOpt
+from curl_cffi.requests import AsyncSession, Session
+
+DEFAULT_MAX_CLIENTS = 10  # Concurrent transfers per async session
+DEFAULT_MAX_PER_HOST = 6  # Open connections per host, like a browser
+
+# impersonate="chrome" sends TLS fingerprints matching real Chrome.
+# V2TLS negotiates HTTP/2 over HTTPS where the server offers it, HTTP/1.1 otherwise.
+SESSION_OPTIONS = {'impersonate': "chrome", 'http_version': CurlHttpVersion.V2TLS}
+
+_session_lock = threading.Lock()
+_shared_session = None
+
+def get_session():
+    """
+    Return the process-wide sync Session used for sitemap fetches.
+
+    Connections (and their TLS/impersonation handshakes) are kept alive and reused
+    across requests and across crawls. curl_cffi gives every thread its own curl
+    handle under the hood, so the session is safe to share between Streamlit threads.
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            _shared_session = Session(**SESSION_OPTIONS)
+        return _shared_session
+
+def create_async_session(max_clients=DEFAULT_MAX_CLIENTS, max_per_host=DEFAULT_MAX_PER_HOST, curl_infos=None):
+    """
+    Create an AsyncSession with the pooled defaults and a per-host connection cap.
+
+    Must be called inside a running event loop. Share the returned session across
+    crawls running in that loop and close it when done. `curl_infos` (CurlInfo
+    values) are read into every response's `infos` once its headers are in.
+    """
+    session = AsyncSession(max_clients=max_clients, curl_infos=curl_infos, **SESSION_OPTIONS)
+    if max_per_host:
+        session.acurl.setopt(CurlMOpt.MAX_HOST_CONNECTIONS, max_per_host)
+    return session
+
+def close_session():
+    """Close the shared sync Session (it is recreated on next use)."""
+    global _shared_session
+    with _session_lock:
+        if _shared_session is not None:
+            _shared_session.close()
+            _shared_session = None
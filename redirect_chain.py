@@ -0,0 +1,79 @@
+import asyncio
+from urllib.parse import urljoin
+
+DEFAULT_MAX_HOPS = 10  # Redirects followed per URL before the chain counts as too long
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+class RedirectProbeError(Exception):
+    """A redirect hop could not be probed; the message becomes the resolution's error."""
+
+class RedirectResolver:
+    """
+    Follows redirect chains, probing every URL at most once per run.
+
+    `probe(url)` is an async callable returning (status, location) for one
+    request without following redirects. resolve() follows the chain that
+    starts at a redirect target. Each hop's probe is cached, and concurrent
+    callers share the same request, so chains with a common tail (r3 -> r2 ->
+    page and r2 -> page) probe it once. A site where thousands of URLs redirect
+    to a few pages therefore costs a few requests, not thousands. Use from a
+    single event loop; aclose() when done.
+
+    A resolution is a dict:
+    - 'hops': [url, status] for every request made, starting at the target
+    - 'final_url' / 'final_status': the last response (status None on error)
+    - 'error': None, 'Too many redirects', 'Redirect loop' or the request error
+    """
+
+    def __init__(self, probe, max_hops=DEFAULT_MAX_HOPS):
+        self.probe = probe
+        self.max_hops = max(1, max_hops)
+        self._probes = {} # URL -> task probing it
+
+    def __len__(self):
+        """Number of distinct URLs probed."""
+        return len(self._probes)
+
+    async def resolve(self, target):
+        """Resolution of the chain starting at `target`, the Location of a first redirect."""
+        url = target
+        hops = []
+        seen = set()
+        # The first redirect (to `url`) was already followed
+        for _ in range(self.max_hops):
+            if url in seen:
+                return _resolution(hops, url, None, 'Redirect loop')
+            seen.add(url)
+            try:
+                status, location = await self._probe(url)
+            except Exception as e:
+                return _resolution(hops, url, None, str(e) or type(e).__name__)
+            hops.append([url, status])
+            if status not in REDIRECT_STATUSES or not location:
+                return _resolution(hops, url, status)
+            url = urljoin(url, location)
+        return _resolution(hops, url, None, 'Too many redirects')
+
+    async def _probe(self, url):
+        task = self._probes.get(url)
+        if task is None:
+            task = self._probes[url] = asyncio.ensure_future(self.probe(url))
+        # Shielded: a cancelled caller must not cancel the probe other chains wait on
+        return await asyncio.shield(task)
+
+    async def aclose(self):
+        """Cancel probes still running (e.g. after a stop)."""
+        pending = [task for task in self._probes.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def _resolution(hops, final_url, final_status, error=None):
+    return {'hops': hops, 'final_url': final_url, 'final_status': final_status, 'error': error}
+
+def describe_chain(url, status, resolution):
+    """'301 https://a -> 302 https://b -> 200 https://c' for a URL and the resolution of its target."""
+    steps = [f"{status} {url}"] + [f"{hop_status} {hop_url}" for hop_url, hop_status in resolution['hops']]
+    if resolution['error']:
+        steps.append(f"{resolution['error']} {resolution['final_url']}")
+    return " -> ".join(steps)
@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from curl_cffi.requests import exceptions as curl_errors
+
+DEFAULT_MAX_ATTEMPTS = 3  # First try included
+DEFAULT_BASE_DELAY = 0.5  # Seconds; the backoff ceiling doubles with every retry
+DEFAULT_MAX_DELAY = 30.0
+MAX_RETRY_AFTER = 120.0  # Longer Retry-After values are not worth waiting for in an audit
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_AFTER_STATUSES = (429, 503)
+# Error types worth another try; DNS, TLS and malformed URLs fail the same way again
+RETRYABLE_ERRORS = ('timeout', 'connection', 'http')
+# Per-host retry budget: retries may add at most BUDGET_RATIO of the host's requests
+# (plus BUDGET_MIN), so a failing host cannot multiply the load on itself
+BUDGET_MIN = 10
+BUDGET_RATIO = 0.2
+
+def classify_exception(error):
+    """Error type of a failed request: timeout, dns, tls, connection, http, invalid_url or other."""
+    if isinstance(error, (asyncio.TimeoutError, curl_errors.Timeout)):
+        return 'timeout'
+    if isinstance(error, curl_errors.DNSError):
+        return 'dns'
+    if isinstance(error, curl_errors.SSLError):
+        return 'tls'
+    if isinstance(error, curl_errors.ConnectionError):
+        return 'connection'
+    if isinstance(error, curl_errors.HTTPError):
+        return 'http'
+    if isinstance(error, (curl_errors.InvalidURL, curl_errors.InvalidSchema, curl_errors.MissingSchema)):
+        return 'invalid_url'
+    return 'other'
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None or when.tzinfo is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed URL check is tried again.
+
+    - Only transient failures are retried: timeouts, connection and HTTP/2 stream
+      errors, and 429/5xx statuses. DNS, TLS, bad URLs and other 4xx are final.
+    - Delays grow exponentially with full jitter (uniform in [0, base * 2**n],
+      capped at max_delay), so retries from many workers do not arrive in waves.
+    - A Retry-After header on 429/503 is honoured as the minimum delay.
+    - Every host has a retry budget (BUDGET_MIN + BUDGET_RATIO of its requests);
+      once spent, that host's failures are final.
+
+    The policy only computes delays; callers sleep without holding a scheduler slot
+    or worker (see seo_analyzer._run_analysis).
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, budget_min=BUDGET_MIN, budget_ratio=BUDGET_RATIO):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_min = budget_min
+        self.budget_ratio = budget_ratio
+        self._requests = {} # Host -> requests made
+        self._retries = {} # Host -> retries granted
+
+    def is_retryable(self, result):
+        """True if a fetch result failed in a way another attempt may fix."""
+        if result.get('fetch_error'):
+            return result.get('error_type') in RETRYABLE_ERRORS
+        return result.get('final_status') in RETRY_STATUSES
+
+    def record_request(self, host):
+        self._requests[host] = self._requests.get(host, 0) + 1
+
+    def budget_left(self, host):
+        allowed = self.budget_min + self.budget_ratio * self._requests.get(host, 0)
+        return allowed - self._retries.get(host, 0)
+
+    def next_delay(self, host, attempt, result, retry_after=None):
+        """
+        Seconds to wait before retrying `result` (attempt is 1 for the first try),
+        or None if it is final. Granting a retry spends the host's budget.
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(result) or self.budget_left(host) < 1:
+            return None
+        if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+            return None
+        self._retries[host] = self._retries.get(host, 0) + 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None and result.get('final_status') in RETRY_AFTER_STATUSES:
+            delay = max(delay, retry_after)
+        return delay
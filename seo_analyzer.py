@@ -1,11 +1,43 @@
 
 import asyncio
-from bs4 import BeautifulSoup
-from curl_cffi.requests import AsyncSession, RequestsError
+import re
+import time
+from functools import partial
+from urllib.parse import urljoin, urlparse
+from head_scanner import scan_head, is_noindex, HeadParsePool
+from curl_cffi.const import CurlECode, CurlInfo
+from curl_cffi.requests import RequestsError
+from http_pool import create_async_session
+from host_scheduler import HostScheduler, DEFAULT_MAX_PER_HOST as SCHEDULER_MAX_PER_HOST
+from redirect_chain import RedirectResolver, RedirectProbeError, REDIRECT_STATUSES, describe_chain
+from seo_cache import DEFAULT_RESULT_TTL, is_fresh
+from sitemap_cache import conditional_headers
+from retry_policy import (
+    RetryPolicy, DEFAULT_MAX_ATTEMPTS, RETRY_STATUSES, RETRY_AFTER_STATUSES, classify_exception, parse_retry_after,
+)
 
 MAX_BODY_SIZE = 250000  # ~250KB
+DEFAULT_CONCURRENCY = 100  # URL checks in flight across all hosts (per-host limits: see host_scheduler)
+BACKOFF_STATUSES = (429, 503)  # Responses that tell us to slow down
+PIPELINE_QUEUE_SIZE = 1000  # URLs buffered between the URL source and the analysis workers
+STOP_POLL_INTERVAL = 0.05  # Seconds between should_stop checks while requests are in flight
+# Canonical and meta robots only live in <head>, so reading stops at its end tag
+HEAD_END_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
+HEAD_END_MAX_LEN = 64  # Longest '</head   >' we look for across a chunk boundary
+DRAIN_LIMIT = 16 * 1024  # Bodies up to this size are read to the end so the connection is reused
+BINARY_TYPES = ('image', 'pdf', 'video', 'audio', 'zip', 'octet-stream')
+# HEAD answers that mean "this server mishandles HEAD", so the URL is fetched with GET instead
+HEAD_FALLBACK_STATUSES = (400, 405, 501)
+HEAD_FALLBACK_ERRORS = (
+    CurlECode.GOT_NOTHING, CurlECode.RECV_ERROR, CurlECode.PARTIAL_FILE, CurlECode.WEIRD_SERVER_REPLY,
+)
+# curl's transfer timings (seconds since the request started), read when the headers arrive
+TIMING_INFOS = (
+    CurlInfo.NAMELOOKUP_TIME, CurlInfo.CONNECT_TIME, CurlInfo.APPCONNECT_TIME, CurlInfo.STARTTRANSFER_TIME,
+)
+TIMING_COLUMNS = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'total_ms')
 
-async def fetch_url(session, url):
+async def fetch_url(session, url, parser=None, head_first=False, check_html=True, redirects=None, conditional=None):
     """
     Fetch a single URL and return SEO metrics using curl_cffi.
     Strictly follows spec:
@@ -14,6 +46,20 @@ async def fetch_url(session, url):
     - Canonical: 1:1 match
     - Noindex: Header or Meta
     - Impersonate: Chrome
+    With a HeadParsePool as `parser`, the head is scanned in a worker process.
+    With `check_html=False` only status, redirect and X-Robots-Tag are checked and
+    no body is read. With `head_first`, a HEAD request is sent first; a GET follows
+    only for 200 HTML pages when check_html is on, or if the server mishandles HEAD.
+    With a RedirectResolver as `redirects`, a redirect's chain is followed to its
+    final status (redirect_chain, redirect_hops, redirect_final_url/status).
+    Timings are in milliseconds: dns_ms, connect_ms and tls_ms are the phase
+    durations of the last request (0 on a reused connection), ttfb_ms its time to
+    first byte, total_ms the whole check without the redirect chain, and
+    bytes_received the body bytes actually read (skipped bodies count 0).
+    With `conditional` (a dict of If-None-Match / If-Modified-Since headers, may be
+    empty), the requests carry those headers, a 304 stops the check, and the
+    response's (ETag, Last-Modified) are left in result['validators'] for the
+    result cache, which removes them again.
     """
     result = {
         'sitemap_url': url,
@@ -23,136 +69,509 @@ async def fetch_url(session, url):
         'canonical_match': False,
         'noindex': False,
         'noindex_source': None,
-        'fetch_error': None
+        'title': None,
+        'page_hreflang': None,
+        'redirect_chain': None,
+        'redirect_hops': None,
+        'redirect_final_url': None,
+        'redirect_final_status': None,
+        'fetch_error': None,
+        'error_type': None,
+        'dns_ms': None,
+        'connect_ms': None,
+        'tls_ms': None,
+        'ttfb_ms': None,
+        'total_ms': None,
+        'bytes_received': None
     }
     
+    started = time.perf_counter()
     try:
-        # stream=True to allow partial reading
-        response = await session.get(url, allow_redirects=False, stream=True, timeout=10)
-        
-        result['final_status'] = response.status_code
-        
-        # 1. Check Redirects
-        if response.status_code in (301, 302, 303, 307, 308):
-            result['redirect_location'] = response.headers.get('Location')
-            return result
-        
-        # 2. Check Content-Type for Binary Files
-        content_type = response.headers.get('Content-Type', '').lower()
-        if any(x in content_type for x in ['image', 'pdf', 'video', 'audio', 'zip', 'octet-stream']):
-            # It's a binary file, just valid status is enough. 
-            # We assume noindex/canonical rules don't apply same way or can't be parsed from body.
-            # Check headers for basics.
-            x_robots = response.headers.get('X-Robots-Tag', '').lower()
-            if 'noindex' in x_robots or 'none' in x_robots:
-                result['noindex'] = True
-                result['noindex_source'] = 'Header'
-            return result
-
-        # 3. Check X-Robots-Tag Header
-        x_robots = response.headers.get('X-Robots-Tag', '').lower()
-        if 'noindex' in x_robots or 'none' in x_robots:
-            result['noindex'] = True
-            result['noindex_source'] = 'Header'
-            
-        # 4. Read Body (Partial)
-        content_accumulated = b""
-        async for chunk in response.aiter_content():
-            content_accumulated += chunk
-            if len(content_accumulated) > MAX_BODY_SIZE:
-                break
-        
-        # Try to decode
         try:
-            text = content_accumulated.decode('utf-8', errors='ignore')
-        except:
-             # If decoding fails completely, treat as binary/error and return
-             return result
-
-        soup = BeautifulSoup(text, 'html.parser')
-        
-        # 5. Check Meta Robots
-        meta_robots = soup.find('meta', attrs={'name': 'robots'})
-        if meta_robots:
-            content_attr = meta_robots.get('content', '').lower()
-            if 'noindex' in content_attr or 'none' in content_attr:
-                result['noindex'] = True
-                src = 'Meta'
-                if result['noindex_source']:
-                    src = 'Both'
-                result['noindex_source'] = src
-        
-        # 6. Check Canonical
-        canonical_tag = soup.find('link', attrs={'rel': 'canonical'})
-        if canonical_tag:
-             result['canonical'] = canonical_tag.get('href')
-        
-        if not result['canonical']:
-            link_header = response.headers.get('Link')
-            # Parse complex Link header if needed, for MVP simple check
-            pass 
-
-        # 7. Verify Match (STRICT)
-        if result['canonical']:
-            # STRICT string comparison - User requirement
-            result['canonical_match'] = (result['canonical'] == url)
-                
-    except asyncio.TimeoutError:
+            await _fetch_into(result, session, url, parser, head_first, check_html, conditional)
+        finally:
+            result['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if redirects is not None and result['redirect_location']:
+            await _follow_redirects(result, redirects)
+    except asyncio.TimeoutError as e:
         result['fetch_error'] = 'Timeout'
+        result['error_type'] = classify_exception(e)
     except RequestsError as e:
         result['fetch_error'] = f"RequestError: {str(e)}"
+        result['error_type'] = classify_exception(e)
     except Exception as e:
         result['fetch_error'] = f"Error: {str(e)}"
+        result['error_type'] = classify_exception(e)
         
     return result
 
-async def analyze_urls(urls, progress_callback=None, should_stop=None):
+async def _fetch_into(result, session, url, parser, head_first, check_html, conditional=None):
+    """The requests of fetch_url: optional HEAD, then a streamed GET unless HEAD was enough."""
+    if head_first:
+        response = await _head_request(session, url, conditional)
+        if response is not None:
+            _record_timing(result, response, conditional)
+            if not (_inspect_headers(response, result) and check_html and needs_get(response)):
+                return
+            # The GET below re-checks everything from its own headers
+            result['noindex'] = False
+            result['noindex_source'] = None
+    # stream=True to allow partial reading
+    response = await session.get(url, headers=conditional, allow_redirects=False, stream=True, timeout=10)
+    _record_timing(result, response, conditional)
+    drain = False  # Errors and cancellation abort the transfer
+    try:
+        drain = await _inspect_response(response, url, result, parser, check_html)
+    finally:
+        await close_stream(response, drain)
+
+def _record_timing(result, response, conditional=None):
+    """Take the connection timings (see TIMING_INFOS) and, for the cache, validators of `response` into `result`."""
+    infos = getattr(response, 'infos', None) or {}
+    dns, connect, tls, ttfb = (infos.get(info, 0.0) for info in TIMING_INFOS)
+    result['dns_ms'] = round(dns * 1000, 1)
+    result['connect_ms'] = round(max(0.0, connect - dns) * 1000, 1)
+    result['tls_ms'] = round(max(0.0, tls - connect) * 1000, 1) if tls else 0.0
+    result['ttfb_ms'] = round(ttfb * 1000, 1)
+    if result['bytes_received'] is None:
+        result['bytes_received'] = 0
+    if conditional is not None:
+        result['validators'] = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+async def _follow_redirects(result, redirects):
+    """Fill the redirect_* chain columns of a redirected URL's result."""
+    url = result['sitemap_url']
+    resolution = await redirects.resolve(urljoin(url, result['redirect_location']))
+    result['redirect_chain'] = describe_chain(url, result['final_status'], resolution)
+    result['redirect_hops'] = 1 + sum(status in REDIRECT_STATUSES for _, status in resolution['hops'])
+    result['redirect_final_url'] = resolution['final_url']
+    result['redirect_final_status'] = resolution['final_status']
+
+async def probe_status(policy, scheduler, session, url, head_first=False):
+    """
+    (status, Location) of a URL without reading its body; a redirect hop for
+    RedirectResolver. Hops are status-only checks paced by the HostScheduler and
+    retried under the RetryPolicy like any analyzed URL, so their 429s and
+    timeouts back off the host too. Raises RedirectProbeError if the hop fails.
+    """
+    attempt = 1
+    while True:
+        res, delay = await attempt_fetch(policy, scheduler, session, url, attempt,
+                                         head_first=head_first, check_html=False)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+        attempt += 1
+    if res['fetch_error']:
+        raise RedirectProbeError(res['fetch_error'])
+    return res['final_status'], res['redirect_location']
+
+async def _head_request(session, url, headers=None):
+    """HEAD request for head_first mode, or None if the server mishandles HEAD."""
+    try:
+        response = await session.head(url, headers=headers, allow_redirects=False, timeout=10)
+    except RequestsError as e:
+        if getattr(e, 'code', None) in HEAD_FALLBACK_ERRORS:
+            return None
+        raise
+    if response.status_code in HEAD_FALLBACK_STATUSES:
+        return None
+    return response
+
+def is_binary(response):
+    content_type = response.headers.get('Content-Type', '').lower()
+    return any(x in content_type for x in BINARY_TYPES)
+
+def needs_get(head_response):
+    """True if a HEAD answer is a 200 HTML page (or untyped), whose head has to be fetched."""
+    content_type = head_response.headers.get('Content-Type', '').lower()
+    return head_response.status_code == 200 and (not content_type or 'html' in content_type)
+
+def _inspect_headers(response, result):
+    """
+    Steps 1-3 of fetch_url: status, redirect target, binary type and X-Robots-Tag.
+    Returns True if the response is a page whose head is worth scanning.
+    """
+    result['final_status'] = response.status_code
+    if response.status_code in RETRY_AFTER_STATUSES:
+        # Consumed (and removed) by the retry policy, see attempt_fetch
+        result['retry_after'] = parse_retry_after(response.headers.get('Retry-After'))
+
+    # Not Modified (conditional request): the cached result stands
+    if response.status_code == 304:
+        return False
+
+    # 1. Check Redirects
+    if response.status_code in REDIRECT_STATUSES:
+        result['redirect_location'] = response.headers.get('Location')
+        return False
+
+    # 2. Check X-Robots-Tag Header
+    x_robots = response.headers.get('X-Robots-Tag', '').lower()
+    if 'noindex' in x_robots or 'none' in x_robots:
+        result['noindex'] = True
+        result['noindex_source'] = 'Header'
+
+    # 3. Binary files: status and headers are all we check
+    return not is_binary(response)
+
+async def _inspect_response(response, url, result, parser=None, check_html=True):
+    """
+    Fill `result` from a streamed GET response (steps 1-7 of fetch_url).
+
+    Returns whether the connection is worth keeping: False for binary files,
+    whose bodies we never want to download.
+    """
+    if not _inspect_headers(response, result) or not check_html:
+        return not is_binary(response)
+
+    # 4. Read Body (Partial: up to </head> or MAX_BODY_SIZE)
+    content_accumulated = await read_head(response, stats=result)
+
+    # Scan the head for robots/googlebot meta, canonical, hreflang and title (no DOM)
+    head = scan_head(content_accumulated) if parser is None else await parser.parse(content_accumulated)
+    result['title'] = head['title']
+    if head['hreflang']:
+        result['page_hreflang'] = " ".join(f"{lang}={href}" for lang, href in head['hreflang'])
+
+    # 5. Check Meta Robots (any robots or googlebot tag)
+    if is_noindex(head):
+        result['noindex'] = True
+        src = 'Meta'
+        if result['noindex_source']:
+            src = 'Both'
+        result['noindex_source'] = src
+
+    # 6. Check Canonical
+    result['canonical'] = head['canonical']
+
+    if not result['canonical']:
+        link_header = response.headers.get('Link')
+        # Parse complex Link header if needed, for MVP simple check
+        pass 
+
+    # 7. Verify Match (STRICT)
+    if result['canonical']:
+        # STRICT string comparison - User requirement
+        result['canonical_match'] = (result['canonical'] == url)
+    return True
+
+async def close_stream(response, drain=True):
+    """
+    Finish a streamed response explicitly, so no early exit leaves a transfer running.
+
+    If `drain`, the rest of the body is read as long as it stays within DRAIN_LIMIT
+    bytes, so an HTTP/1.1 connection goes back to the pool. Chunked bodies (no
+    Content-Length, as most HTML pages) are read until they pass the limit, and a
+    larger Content-Length is not read at all. Anything else is aborted: a dropped
+    HTTP/1.1 connection is cheaper than downloading a PDF we will not parse, and
+    on HTTP/2 only the stream is reset.
+    """
+    length = response.headers.get('Content-Length', '')
+    complete = False
+    try:
+        if drain and not (length.isdigit() and int(length) > DRAIN_LIMIT):
+            complete = await _drain(response)
+    except Exception:
+        pass # The check is done; a failed drain only costs the connection
+    finally:
+        if not complete:
+            response.quit_now.set()
+        await response.aclose()
+
+async def _drain(response):
+    """Read the rest of a streamed body; False once more than DRAIN_LIMIT bytes came."""
+    task = getattr(response, 'astream_task', None)
+    if task is not None and task.done():
+        return True # Transfer already over (e.g. the end was read with the head)
+    drained = 0
+    async for chunk in response.aiter_content():
+        drained += len(chunk)
+        if drained > DRAIN_LIMIT:
+            return False
+    return True
+
+async def read_head(response, max_bytes=MAX_BODY_SIZE, stats=None):
+    """
+    Read a streamed body into a bytearray until `</head>` has arrived or
+    `max_bytes` are in (the result is trimmed to exactly max_bytes).
+
+    Chunks are appended in place, so reading is linear in the body size, and
+    each chunk is only searched from just before its start for the end tag.
+    If `stats` (a fetch result) is given, its bytes_received counts every body byte read.
+    """
+    body = bytearray()
+    async for chunk in response.aiter_content():
+        if stats is not None:
+            stats['bytes_received'] = (stats['bytes_received'] or 0) + len(chunk)
+        scan_from = max(0, len(body) - HEAD_END_MAX_LEN)
+        body += chunk
+        if len(body) >= max_bytes:
+            del body[max_bytes:]
+            break
+        match = HEAD_END_RE.search(body, scan_from)
+        if match:
+            del body[match.end():] # Nothing after the head is parsed
+            break
+    return body
+
+def create_analysis_session(concurrency=DEFAULT_CONCURRENCY):
+    """Pooled AsyncSession sized for the scheduler: `concurrency` transfers, per-host cap at the AIMD ceiling."""
+    return create_async_session(max_clients=concurrency, max_per_host=SCHEDULER_MAX_PER_HOST,
+                                curl_infos=list(TIMING_INFOS))
+
+async def analyze_urls(urls, progress_callback=None, should_stop=None, concurrency=DEFAULT_CONCURRENCY,
+                       queue_size=PIPELINE_QUEUE_SIZE, parse_processes=0, head_first=False, check_html=True,
+                       max_redirects=0, max_attempts=DEFAULT_MAX_ATTEMPTS, cache=None, cache_ttl=DEFAULT_RESULT_TTL):
     """
     Analyze a list of URLs concurrently using curl_cffi AsyncSession.
+
+    A fixed pool of `concurrency` worker coroutines pulls URLs from a bounded queue,
+    so memory for pending work scales with concurrency rather than with len(urls).
+    Requests are paced per host by a HostScheduler (AIMD limits, backoff on
+    429/503 and timeouts). Stopping cancels in-flight requests right away; the
+    results gathered so far are returned. With `parse_processes` > 0, page heads
+    are scanned in that many worker processes (see HeadParsePool) instead of on
+    the event loop, so parsing scales with cores while the loop only moves bytes.
+
+    `check_html=False` makes a status-only run (status, redirect, X-Robots-Tag; no
+    canonical or meta checks). With `head_first`, HEAD requests are sent and only
+    200 HTML pages that still need their head checked are fetched with GET (see fetch_url).
+    With `max_redirects` > 0, redirect chains are followed up to that many hops,
+    probing each distinct hop once per run (see RedirectResolver). Hops are paced
+    and retried like the URLs themselves.
+    Transient failures are tried up to `max_attempts` times in total, with
+    jittered exponential backoff and per-host budgets (see RetryPolicy); a URL
+    waiting for its retry holds neither a worker nor a scheduler slot.
+    With a SeoResultCache as `cache`, URLs checked less than `cache_ttl` seconds
+    ago (with the same check options) are answered from the cache without a
+    request, and older entries are revalidated with conditional requests
+    (ETag / Last-Modified; a 304 keeps the stored result). Results then carry
+    cache_status: 'cached', 'not_modified' or 'fetched'; cached results have
+    no timings, bytes_received or attempts, as no request was made.
     """
-    results = []
-    # curl_cffi doesn't use Semaphore directly on session, but we can limit concurrency via asyncio
-    sem = asyncio.Semaphore(30)  # Concurrency limit
+    total = len(urls)
     
-    # Create one session for all requests to reuse connection pool/signatures?
-    # curl_cffi sessions are good for keeping cookies/preset headers
-    async with AsyncSession(impersonate="chrome") as session:
-        tasks = []
+    async def url_source():
         for url in urls:
-             task = asyncio.create_task(bounded_fetch(sem, session, url))
-             tasks.append(task)
-        
-        # Monitor progress
-        total = len(tasks)
-        completed = 0
-        
-        for coro in asyncio.as_completed(tasks):
-            if should_stop and should_stop():
-                # Cancel remaining tasks
-                for t in tasks:
-                    t.cancel()
-                break
-                
-            try:
-                res = await coro
-                results.append(res)
-            except asyncio.CancelledError:
-                pass
-                
-            completed += 1
-            if progress_callback:
-                progress_callback(completed / total)
+            yield url
+    
+    def on_progress(completed, _discovered):
+        if progress_callback:
+            progress_callback(completed / max(total, 1))
+    
+    return await _run_analysis(url_source(), on_progress, should_stop, concurrency, queue_size,
+                               parse_processes=parse_processes, max_redirects=max_redirects,
+                               max_attempts=max_attempts, cache=cache, cache_ttl=cache_ttl,
+                               head_first=head_first, check_html=check_html)
+
+async def analyze_url_stream(url_source, progress_callback=None, should_stop=None,
+                             concurrency=DEFAULT_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE, parse_processes=0,
+                             head_first=False, check_html=True, max_redirects=0,
+                             max_attempts=DEFAULT_MAX_ATTEMPTS, cache=None, cache_ttl=DEFAULT_RESULT_TTL):
+    """
+    Analyze URLs from an async iterable while it is still producing them.
+
+    Same worker pool as analyze_urls: checks start as soon as the first URLs
+    arrive, and a full queue pauses the producer (e.g. a sitemap crawl) until
+    analysis catches up. `parse_processes`, `head_first`, `check_html`,
+    `max_redirects`, `max_attempts`, `cache` and `cache_ttl` work as in analyze_urls.
+    progress_callback receives completed / discovered-so-far.
+    """
+    def on_progress(completed, discovered):
+        if progress_callback:
+            progress_callback(completed / max(discovered, 1))
+    
+    return await _run_analysis(url_source, on_progress, should_stop, concurrency, queue_size,
+                               parse_processes=parse_processes, max_redirects=max_redirects,
+                               max_attempts=max_attempts, cache=cache, cache_ttl=cache_ttl,
+                               head_first=head_first, check_html=check_html)
+
+async def _run_analysis(url_source, on_progress, should_stop, concurrency, queue_size, parse_processes=0,
+                        max_redirects=0, max_attempts=DEFAULT_MAX_ATTEMPTS, cache=None,
+                        cache_ttl=DEFAULT_RESULT_TTL, **fetch_options):
+    """
+    Worker pool behind analyze_urls / analyze_url_stream.
+
+    URLs from `url_source` are fed into a bounded queue that `concurrency`
+    workers drain. `should_stop` is checked before every request and
+    polled every STOP_POLL_INTERVAL, so a stop cancels the feeder, the workers
+    and their in-flight requests without waiting for them to finish.
+    A URL due for a retry waits in its own sleeping task and is then queued
+    again, so the worker moves on to the next URL meanwhile. Fresh cached
+    results are taken before a URL needs a scheduler slot.
+    `fetch_options` are passed on to fetch_url.
+    """
+    results = []
+    scheduler = HostScheduler(max_total=concurrency)
+    policy = RetryPolicy(max_attempts)
+    parser = HeadParsePool(parse_processes) if parse_processes > 0 else None
+    fetch_options['parser'] = parser
+    profile = cache_profile(fetch_options.get('check_html', True), max_redirects)
+    queue = asyncio.Queue(maxsize=queue_size) # (url, attempt)
+    retries = set() # Tasks sleeping until a URL's next attempt
+    discovered = 0
+    unfinished = 0 # URLs queued, being fetched or waiting for a retry
+    feeding = True
+    all_done = asyncio.Event()
+    
+    def stopping():
+        return should_stop is not None and should_stop()
+    
+    def finish(res):
+        nonlocal unfinished
+        results.append(res)
+        on_progress(len(results), discovered)
+        unfinished -= 1
+        if not unfinished and not feeding:
+            all_done.set()
+    
+    async def retry_later(url, attempt, delay):
+        await asyncio.sleep(delay)
+        await queue.put((url, attempt))
+    
+    async def worker(session):
+        while True:
+            url, attempt = await queue.get()
+            if stopping():
+                return
+            options = fetch_options
+            entry = cache.get(url, profile) if cache is not None else None
+            if entry is not None and is_fresh(entry, cache_ttl):
+                # No request was made: stored timings and attempts belong to the run that stored it
+                finish(dict(entry['result'], **dict.fromkeys(TIMING_COLUMNS + ('bytes_received', 'attempts')),
+                            cache_status='cached'))
+                continue
+            if cache is not None:
+                options = dict(fetch_options, conditional=conditional_headers(entry))
+            res, delay = await attempt_fetch(policy, scheduler, session, url, attempt, **options)
+            if delay is None:
+                if cache is not None:
+                    res = update_cache(cache, profile, res, entry)
+                finish(res)
+            else:
+                task = asyncio.create_task(retry_later(url, attempt + 1, delay))
+                retries.add(task)
+                task.add_done_callback(retries.discard)
+    
+    async def feed():
+        nonlocal discovered, unfinished, feeding
+        async for url in url_source:
+            if stopping():
+                return
+            unfinished += 1
+            await queue.put((url, 1))
+            discovered += 1
+        feeding = False
+        if not unfinished:
+            all_done.set()
+    
+    async def feed_and_wait():
+        await feed()
+        await all_done.wait()
+    
+    async def run_pool(session):
+        workers = [asyncio.create_task(worker(session)) for _ in range(max(1, concurrency))]
+        finished = asyncio.create_task(feed_and_wait())
+        pending = {finished, *workers}
+        try:
+            while finished in pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()  # An error that killed a worker would otherwise leave all_done unset
+        finally:
+            for task in [finished] + workers + list(retries):
+                task.cancel()
+            await asyncio.gather(finished, *workers, *retries, return_exceptions=True)
+    
+    async def wait_for_stop():
+        while not stopping():
+            await asyncio.sleep(STOP_POLL_INTERVAL)
+    
+    async with create_analysis_session(concurrency) as session:
+        redirects = None
+        if max_redirects > 0:
+            probe = partial(probe_status, policy, scheduler, session, head_first=fetch_options.get('head_first', False))
+            redirects = fetch_options['redirects'] = RedirectResolver(probe, max_redirects)
+        pool = asyncio.create_task(run_pool(session))
+        watcher = asyncio.create_task(wait_for_stop())
+        try:
+            await asyncio.wait((pool, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if pool.done():
+                pool.result()  # Re-raise unexpected errors
+        finally:
+            for task in (pool, watcher):
+                task.cancel()
+            await asyncio.gather(pool, watcher, return_exceptions=True)
+            if redirects is not None:
+                await redirects.aclose()
+            if parser is not None:
+                parser.close()
+            if cache is not None:
+                cache.flush()
+            if hasattr(url_source, 'aclose'):
+                await url_source.aclose()
                 
     return results
 
-async def bounded_fetch(sem, session, url):
-    async with sem:
-        # Retry logic: 1 retry
-        for attempt in range(2):
-            res = await fetch_url(session, url)
-            if not res['fetch_error']:
-                return res
-            # If error, wait briefly and retry if it's the first attempt
-            if attempt == 0:
-                await asyncio.sleep(0.5)
+def cache_profile(check_html, max_redirects):
+    """Key for the check options a cached result depends on (see SeoResultCache)."""
+    return f"html={int(bool(check_html))};redirects={max_redirects}"
+
+def update_cache(cache, profile, res, entry=None):
+    """
+    Store a final fetch result in the result cache, or on a 304 return the stored
+    result (with this check's timings and attempts) and mark it revalidated.
+    Errors and transient statuses are not stored.
+    """
+    etag, last_modified = res.pop('validators', None) or (None, None)
+    if res['final_status'] == 304 and entry is not None:
+        cache.touch(res['sitemap_url'])
+        fresh = {k: res[k] for k in TIMING_COLUMNS + ('bytes_received', 'attempts') if k in res}
+        return dict(entry['result'], **fresh, cache_status='not_modified')
+    if not res['fetch_error'] and res['final_status'] not in RETRY_STATUSES:
+        cache.put(res['sitemap_url'], profile, res, etag, last_modified)
+    return dict(res, cache_status='fetched')
+
+def is_backoff_signal(result):
+    """True if a fetch result says the host is overloaded (429/503 or a timeout)."""
+    if result['final_status'] in BACKOFF_STATUSES:
+        return True
+    if result.get('error_type') == 'timeout':
+        return True
+    error = result['fetch_error'] or ''
+    return error == 'Timeout' or 'timed out' in error.lower()
+
+async def scheduled_fetch(scheduler, session, url, **fetch_options):
+    """fetch_url inside a HostScheduler slot; the outcome adjusts the host's limit."""
+    if scheduler is None:
+        return await fetch_url(session, url, **fetch_options)
+    host = await scheduler.acquire(url)
+    res = None
+    try:
+        res = await fetch_url(session, url, **fetch_options)
         return res
+    finally:
+        congested = res is not None and is_backoff_signal(res)
+        # The same Retry-After sets the host pause and the retry delay (attempt_fetch)
+        scheduler.release(host, congested=congested, retry_after=res.get('retry_after') if congested else None)
+
+async def attempt_fetch(policy, scheduler, session, url, attempt, **fetch_options):
+    """
+    One attempt (1-based) at a URL under a RetryPolicy.
+
+    Returns (result, delay): delay is None when the result is final (it then
+    carries 'attempts'), otherwise the seconds to wait before the next attempt.
+    A final redirect is followed with fetch_options['redirects'] after the
+    scheduler slot is given back, as the hop probes take slots of their own.
+    """
+    redirects = fetch_options.pop('redirects', None)
+    host = urlparse(url).netloc
+    policy.record_request(host)
+    res = await scheduled_fetch(scheduler, session, url, **fetch_options)
+    delay = policy.next_delay(host, attempt, res, res.pop('retry_after', None))
+    if delay is None:
+        res['attempts'] = attempt
+        if redirects is not None and res.get('redirect_location'):
+            await _follow_redirects(res, redirects)
+    return res, delay
@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_SEO_CACHE_PATH = ".seo_cache.sqlite3"
+DEFAULT_RESULT_TTL = 24 * 3600  # Seconds a stored result is reused without asking the server
+WRITE_BATCH_SIZE = 500  # Buffered puts/touches written per transaction
+
+class SeoResultCache:
+    """
+    On-disk store of SEO check results keyed by URL, for incremental audits.
+
+    Each entry keeps the last result, when it was checked and the page's
+    validators (ETag / Last-Modified). analyze_urls reuses results younger than
+    the TTL without a request, and revalidates older ones with a conditional
+    request: a 304 keeps the stored result and only costs the headers.
+
+    `profile` describes the checks that produced a result (e.g. status-only vs.
+    full head checks); entries are only reused by runs with the same profile.
+
+    put() and touch() are buffered and written WRITE_BATCH_SIZE at a time in one
+    transaction, so an analysis does not commit once per URL; get() sees buffered
+    writes. Call flush() at the end of a run (close() flushes too).
+    """
+
+    def __init__(self, path=DEFAULT_SEO_CACHE_PATH):
+        self.path = path
+        # Analyses run on Streamlit script threads; a lock keeps the shared connection safe
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._puts = {} # url -> row not yet written
+        self._touches = {} # url -> checked_at not yet written
+        # WAL with synchronous=NORMAL: commits append to the log without an fsync each
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    url TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    checked_at REAL NOT NULL
+                )"""
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            self._write_pending()
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, url, profile):
+        """Return the stored entry for a URL checked with `profile`, or None."""
+        with self._lock:
+            pending = self._puts.get(url)
+            if pending is not None:
+                row = pending[2:] if pending[1] == profile else None
+            else:
+                row = self._conn.execute(
+                    "SELECT result, etag, last_modified, checked_at FROM results WHERE url = ? AND profile = ?",
+                    (url, profile),
+                ).fetchone()
+                if row is not None and url in self._touches:
+                    row = row[:3] + (self._touches[url],)
+        if row is None:
+            return None
+        result, etag, last_modified, checked_at = row
+        return {'result': json.loads(result), 'etag': etag, 'last_modified': last_modified, 'checked_at': checked_at}
+
+    def put(self, url, profile, result, etag=None, last_modified=None):
+        """Store a fresh check result with the validators of its response (buffered)."""
+        with self._lock:
+            self._touches.pop(url, None)
+            self._puts[url] = (url, profile, json.dumps(result), etag, last_modified, time.time())
+            self._write_pending(WRITE_BATCH_SIZE)
+
+    def touch(self, url):
+        """Mark a stored result as revalidated, i.e. the server answered 304 (buffered)."""
+        with self._lock:
+            if url in self._puts:
+                self._puts[url] = self._puts[url][:5] + (time.time(),)
+            else:
+                self._touches[url] = time.time()
+            self._write_pending(WRITE_BATCH_SIZE)
+
+    def flush(self):
+        """Write buffered puts and touches."""
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self, threshold=1):
+        # Caller holds the lock
+        if len(self._puts) + len(self._touches) < threshold:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (url, profile, result, etag, last_modified, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._puts.values(),
+            )
+            self._conn.executemany(
+                "UPDATE results SET checked_at = ? WHERE url = ?",
+                ((checked_at, url) for url, checked_at in self._touches.items()),
+            )
+        self._puts.clear()
+        self._touches.clear()
+
+    def prune(self, max_age):
+        """Delete results not checked for `max_age` seconds. Returns how many were removed."""
+        with self._lock, self._conn:
+            self._write_pending()
+            return self._conn.execute("DELETE FROM results WHERE checked_at < ?", (time.time() - max_age,)).rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._puts.clear()
+            self._touches.clear()
+            self._conn.execute("DELETE FROM results")
+
+def is_fresh(entry, ttl, now=None):
+    """True if a stored entry may be reused without a request (ttl <= 0: never)."""
+    return ttl > 0 and (time.time() if now is None else now) - entry['checked_at'] < ttl
@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = ".sitemap_cache.sqlite3"
+
+class SitemapCache:
+    """
+    On-disk cache of parsed sitemaps keyed by sitemap URL.
+
+    Each entry keeps the response validators (ETag / Last-Modified) together with
+    the parsed URL and child sitemap lists, so a repeat crawl can send a
+    conditional GET and reuse the stored parse when the server answers 304.
+
+    It doubles as the crawl manifest: `index_lastmod` is the <lastmod> the parent
+    index advertised when the sitemap was last crawled, which lets incremental
+    crawls skip children that have not changed since.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        # Crawls run on Streamlit script threads; a lock keeps the shared connection safe
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sitemaps (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    payload BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    index_lastmod TEXT
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sitemaps)")}
+            if 'index_lastmod' not in columns:
+                # Caches written before the manifest columns existed
+                self._conn.execute("ALTER TABLE sitemaps ADD COLUMN index_lastmod TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url):
+        """Return the cached entry for a sitemap URL, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, payload, fetched_at, index_lastmod FROM sitemaps WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, payload, fetched_at, index_lastmod = row
+        data = json.loads(zlib.decompress(payload))
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'urls': data['urls'],
+            'child_sitemaps': data['child_sitemaps'],
+            'sitemap_lastmods': data.get('sitemap_lastmods', {}),
+            'url_details': data.get('url_details', {}),
+            'fetched_at': fetched_at,
+            'index_lastmod': index_lastmod,
+        }
+
+    def put(self, url, etag, last_modified, urls, child_sitemaps, sitemap_lastmods=None, index_lastmod=None,
+            url_details=None):
+        """Store the parse result (including per-URL fields), validators and index lastmod of a sitemap fetch."""
+        data = {
+            'urls': urls,
+            'child_sitemaps': child_sitemaps,
+            'sitemap_lastmods': sitemap_lastmods or {},
+            'url_details': url_details or {},
+        }
+        # URL lists compress ~10x, which keeps caches of huge indexes small
+        payload = zlib.compress(json.dumps(data).encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sitemaps (url, etag, last_modified, payload, fetched_at, index_lastmod) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, payload, time.time(), index_lastmod),
+            )
+
+    def touch(self, url, index_lastmod=None):
+        """Mark a cached entry as revalidated (e.g. after a 304), recording the current index lastmod."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sitemaps SET fetched_at = ?, index_lastmod = COALESCE(?, index_lastmod) WHERE url = ?",
+                (time.time(), index_lastmod, url),
+            )
+
+def conditional_headers(entry):
+    """Build If-None-Match / If-Modified-Since headers from a cache entry."""
+    headers = {}
+    if entry:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
@@ -0,0 +1,148 @@
+import asyncio
+from urllib.parse import urljoin, urlparse
+from http_pool import get_session, create_async_session, DEFAULT_MAX_PER_HOST
+from sitemap_parser import is_gzip, extract_urls_recursive, extract_urls_recursive_async, DEFAULT_CONCURRENCY
+
+# Where sites commonly publish a sitemap without listing it in robots.txt
+COMMON_SITEMAP_PATHS = ("/sitemap.xml", "/sitemap_index.xml", "/sitemap-index.xml", "/sitemap.xml.gz")
+SNIFF_BYTES = 16 * 1024  # Body prefix read when probing a common location
+
+class _SniffDone(Exception):
+    """Raised from the content callback to stop a probe download early."""
+
+def site_root(domain):
+    """Normalize 'example.com' or any URL on the site to 'https://example.com'."""
+    domain = domain.strip()
+    if "://" not in domain:
+        domain = "https://" + domain
+    parsed = urlparse(domain)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def parse_robots_sitemaps(text, base_url):
+    """Return the `Sitemap:` URLs of a robots.txt body, in order and without repeats."""
+    sitemaps = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        field, _, value = line.partition(':')
+        if field.strip().lower() == 'sitemap' and value.strip():
+            sitemap = urljoin(base_url, value.strip())
+            if sitemap not in sitemaps:
+                sitemaps.append(sitemap)
+    return sitemaps
+
+def looks_like_sitemap(head):
+    """Guess from the first bytes of a body whether it is a (possibly gzipped) sitemap."""
+    return is_gzip(head) or b'<urlset' in head or b'<sitemapindex' in head
+
+def discover_sitemaps(domain, probe_common=True):
+    """
+    Find a site's sitemap roots: the `Sitemap:` lines of robots.txt, then (with
+    `probe_common`) the COMMON_SITEMAP_PATHS that serve a sitemap.
+    Returns (sitemap_urls, errors).
+    """
+    base = site_root(domain)
+    roots = []
+    errors = []
+    try:
+        response = get_session().get(base + "/robots.txt", timeout=10)
+        if response.status_code == 200:
+            roots = parse_robots_sitemaps(response.text, base)
+    except Exception as e:
+        errors.append(f"Error fetching {base}/robots.txt: {e}")
+    if probe_common:
+        for path in COMMON_SITEMAP_PATHS:
+            url = base + path
+            if url not in roots and _probe_sitemap(url):
+                roots.append(url)
+    if not roots:
+        errors.append(f"No sitemaps found for {base}")
+    return roots, errors
+
+def _probe_sitemap(url):
+    head = bytearray()
+    
+    def sniff(chunk):
+        head.extend(chunk)
+        if len(head) >= SNIFF_BYTES:
+            raise _SniffDone()
+    
+    try:
+        response = get_session().get(url, timeout=10, content_callback=sniff)
+        if response.status_code != 200:
+            return False
+    except _SniffDone:
+        pass  # Enough of the body to decide
+    except Exception:
+        return False
+    return looks_like_sitemap(bytes(head[:SNIFF_BYTES]))
+
+async def discover_sitemaps_async(domain, session, probe_common=True):
+    """Async variant of discover_sitemaps; common locations are probed in parallel over `session`."""
+    base = site_root(domain)
+    roots = []
+    errors = []
+    try:
+        response = await session.get(base + "/robots.txt", timeout=10)
+        if response.status_code == 200:
+            roots = parse_robots_sitemaps(response.text, base)
+    except Exception as e:
+        errors.append(f"Error fetching {base}/robots.txt: {e}")
+    if probe_common:
+        candidates = [base + path for path in COMMON_SITEMAP_PATHS if base + path not in roots]
+        found = await asyncio.gather(*(_probe_sitemap_async(session, url) for url in candidates))
+        roots += [url for url, ok in zip(candidates, found) if ok]
+    if not roots:
+        errors.append(f"No sitemaps found for {base}")
+    return roots, errors
+
+async def _probe_sitemap_async(session, url):
+    try:
+        response = await session.get(url, timeout=10, stream=True)
+        try:
+            if response.status_code != 200:
+                return False
+            head = bytearray()
+            async for chunk in response.aiter_content():
+                head.extend(chunk)
+                if len(head) >= SNIFF_BYTES:
+                    break
+            return looks_like_sitemap(bytes(head[:SNIFF_BYTES]))
+        finally:
+            response.quit_now.set()
+            await response.aclose()
+    except Exception:
+        return False
+
+def extract_urls_from_domain(domain, probe_common=True, **kwargs):
+    """
+    Discover a site's sitemap roots and crawl them as one crawl with a shared dedup set.
+
+    Takes the same keyword arguments as iter_sitemap_batches and returns the usual
+    (all_urls, processed_sitemaps, errors) triple; discovery errors come first.
+    """
+    roots, errors = discover_sitemaps(domain, probe_common)
+    if not roots:
+        return [], [], errors
+    all_urls, processed_sitemaps, crawl_errors = extract_urls_recursive(roots, **kwargs)
+    return all_urls, processed_sitemaps, errors + crawl_errors
+
+async def extract_urls_from_domain_async(domain, probe_common=True, concurrency=DEFAULT_CONCURRENCY,
+                                         session=None, max_per_host=DEFAULT_MAX_PER_HOST, **kwargs):
+    """
+    Async variant of extract_urls_from_domain: the roots are crawled in parallel, and
+    discovery and crawl share one connection pool (`session`, or one created here).
+    """
+    owns_session = session is None
+    if owns_session:
+        session = create_async_session(max_clients=max(1, concurrency), max_per_host=max_per_host)
+    try:
+        roots, errors = await discover_sitemaps_async(domain, session, probe_common)
+        if not roots:
+            return [], [], errors
+        all_urls, processed_sitemaps, crawl_errors = await extract_urls_recursive_async(
+            roots, concurrency=concurrency, session=session, **kwargs
+        )
+        return all_urls, processed_sitemaps, errors + crawl_errors
+    finally:
+        if owns_session:
+            await session.close()
@@ -1,41 +1,410 @@
-import gzip
+import asyncio
 import io
+import zlib
+from collections import deque
 from bs4 import BeautifulSoup
+from lxml import etree
 from urllib.parse import urlparse
-from curl_cffi import requests
+from http_pool import get_session, create_async_session, DEFAULT_MAX_PER_HOST
+from sitemap_cache import conditional_headers
+from url_store import UrlStore
+from url_dedup import ExactDedup
+from crawl_checkpoint import CrawlCheckpoint, DEFAULT_CHECKPOINT_EVERY
+
+DEFAULT_CONCURRENCY = 10  # Parallel child sitemap downloads in the async crawler
+DEFAULT_PARSER_ENGINE = "stream"  # "stream" (lxml incremental) or "soup" (BeautifulSoup tree)
+PARSE_CHUNK_SIZE = 64 * 1024  # Bytes fed to the streaming parser at a time
+# sitemaps.org caps a sitemap at 50 MB uncompressed; leave slack for sloppy generators
+MAX_DECOMPRESSED_BYTES = 100 * 1024 * 1024
+
+# Sub-elements kept from <video:video> entries (sitemaps.org video extension)
+VIDEO_FIELDS = ("title", "content_loc", "player_loc", "thumbnail_loc")
+_NO_DETAILS = {}
+
+class SitemapTooLargeError(Exception):
+    """Raised when a sitemap body grows past the configured decompressed size cap."""
 
 def is_gzip(content):
     """Check if content is gzipped based on magic numbers."""
     return content[:2] == b'\x1f\x8b'
 
-def fetch_sitemap_content(url):
-    """Fetch sitemap content using curl_cffi to impersonate Chrome."""
+def fetch_sitemap_content(url, max_bytes=MAX_DECOMPRESSED_BYTES):
+    """Fetch sitemap content using curl_cffi to impersonate Chrome (pooled session, see http_pool)."""
     try:
-        # impersonate="chrome" sends TLS fingerprints matching real Chrome
-        response = requests.get(url, impersonate="chrome", timeout=10)
+        response = get_session().get(url, timeout=10)
         response.raise_for_status()
         
-        content = response.content
-        if is_gzip(content) or url.endswith('.gz'):
-            try:
-                content = gzip.decompress(content)
-            except OSError:
-                # Fallback if it looked like gzip but wasn't
-                pass
+        decoder = SitemapBodyDecoder(max_bytes)
+        content = decoder.decode(response.content) + decoder.flush()
         return content, None  # content, error_msg
     except Exception as e:
         return None, f"Error fetching {url}: {e}"
 
-def parse_sitemap(content):
+def fetch_and_parse_sitemap(url, max_bytes=MAX_DECOMPRESSED_BYTES, cache=None, lastmod=None, trust_lastmod=False):
+    """
+    Stream a sitemap straight into the parser, gunzipping on the fly.
+
+    Neither the compressed nor the decompressed body is held in memory as a whole.
+    With a SitemapCache, a conditional GET is sent and a 304 reuses the cached parse.
+    `lastmod` is the value the parent index advertised for this sitemap; it is
+    recorded in the cache, and with `trust_lastmod` an unchanged value skips the
+    request entirely.
+    Returns (final_urls, sitemap_index_urls, sitemap_lastmods, url_details, error_msg);
+    url_details maps a URL to its optional fields (see SitemapStreamParser).
+    """
+    try:
+        entry = cache.get(url) if cache is not None else None
+        if trust_lastmod and _lastmod_unchanged(entry, lastmod):
+            return _cached_result(entry)
+            
+        # Body chunks go straight from curl's write callback into the parser. Unlike
+        # stream=True (which clones the curl handle) this keeps the pooled connection.
+        body_parser = SitemapBodyParser(max_bytes)
+        
+        def on_chunk(chunk):
+            body_parser.feed(chunk)
+            return len(chunk) # curl expects the byte count; a raise (size cap) aborts the transfer
+        
+        response = get_session().get(
+            url, timeout=10, headers=conditional_headers(entry), content_callback=on_chunk
+        )
+        response.raise_for_status()
+        if response.status_code == 304 and entry:
+            cache.touch(url, lastmod)
+            return _cached_result(entry)
+        urls, child_sitemaps = body_parser.close()
+        _store_in_cache(cache, url, response, body_parser, lastmod)
+        return urls, child_sitemaps, body_parser.sitemap_lastmods, body_parser.url_details, None
+    except Exception as e:
+        return [], [], {}, {}, f"Error fetching {url}: {e}"
+
+async def fetch_and_parse_sitemap_async(session, url, max_bytes=MAX_DECOMPRESSED_BYTES, cache=None,
+                                        lastmod=None, trust_lastmod=False):
+    """Async variant of fetch_and_parse_sitemap using a shared curl_cffi AsyncSession (see http_pool)."""
+    try:
+        entry = cache.get(url) if cache is not None else None
+        if trust_lastmod and _lastmod_unchanged(entry, lastmod):
+            return _cached_result(entry)
+            
+        response = await session.get(url, timeout=10, stream=True, headers=conditional_headers(entry))
+        try:
+            response.raise_for_status()
+            if response.status_code == 304 and entry:
+                cache.touch(url, lastmod)
+                return _cached_result(entry)
+            body_parser = SitemapBodyParser(max_bytes)
+            async for chunk in response.aiter_content():
+                body_parser.feed(chunk)
+            urls, child_sitemaps = body_parser.close()
+        finally:
+            # Abort the transfer if we bailed out early (cap hit, bad status, 304)
+            response.quit_now.set()
+            await response.aclose()
+        _store_in_cache(cache, url, response, body_parser, lastmod)
+        return urls, child_sitemaps, body_parser.sitemap_lastmods, body_parser.url_details, None
+    except Exception as e:
+        return [], [], {}, {}, f"Error fetching {url}: {e}"
+
+def _cached_result(entry):
+    return entry['urls'], entry['child_sitemaps'], entry['sitemap_lastmods'], entry['url_details'], None
+
+def _lastmod_unchanged(entry, lastmod):
+    """True if the parent index still advertises the lastmod we crawled this sitemap at."""
+    return entry is not None and lastmod is not None and entry['index_lastmod'] == lastmod
+
+def _store_in_cache(cache, url, response, body_parser, lastmod):
+    """Remember a fresh parse if we can later revalidate it (HTTP validators or index lastmod)."""
+    if cache is None:
+        return
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified or lastmod:
+        cache.put(url, etag, last_modified, body_parser.final_urls, body_parser.sitemap_index_urls,
+                  body_parser.sitemap_lastmods, lastmod, body_parser.url_details)
+
+class SitemapBodyDecoder:
+    """
+    Turns raw sitemap body chunks into XML bytes, gunzipping on the fly when the
+    body starts with the gzip magic number.
+
+    Raises SitemapTooLargeError once more than `max_bytes` would come out, without
+    ever inflating past the cap (protects against decompression bombs).
+    """
+
+    def __init__(self, max_bytes=MAX_DECOMPRESSED_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._head = b''
+        self._inflater = None
+        self._sniffed = False
+
+    def decode(self, chunk):
+        if not self._sniffed:
+            # Need the first two bytes to tell gzip from plain XML
+            self._head += chunk
+            if len(self._head) < 2:
+                return b''
+            chunk, self._head = self._head, b''
+            self._sniffed = True
+            if is_gzip(chunk):
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                
+        if self._inflater is None:
+            return self._count(chunk)
+            
+        out = []
+        while chunk:
+            # Ask for at most one byte past the cap so overflow is detected without inflating more
+            data = self._inflater.decompress(chunk, self.max_bytes - self.total_bytes + 1)
+            out.append(self._count(data))
+            chunk = self._inflater.unconsumed_tail
+            if self._inflater.eof:
+                # Concatenated gzip members (what gzip.decompress also accepts)
+                chunk = self._inflater.unused_data + chunk
+                if not chunk:
+                    break
+                if not is_gzip(chunk):
+                    break  # Trailing garbage after the last member - ignore it
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return b''.join(out)
+
+    def flush(self):
+        if not self._sniffed:
+            # Body shorter than the gzip magic number
+            self._sniffed = True
+            return self._count(self._head)
+        return b''
+
+    def _count(self, data):
+        self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            raise SitemapTooLargeError(f"sitemap exceeds {self.max_bytes} bytes after decompression")
+        return data
+
+class SitemapBodyParser:
+    """
+    Decoder + streaming parser: feed raw body chunks, close() returns (final_urls, sitemap_index_urls).
+    Index entry lastmods and per-URL fields are available as `sitemap_lastmods` and
+    `url_details` afterwards.
+    """
+
+    def __init__(self, max_bytes=MAX_DECOMPRESSED_BYTES):
+        self._decoder = SitemapBodyDecoder(max_bytes)
+        self._parser = SitemapStreamParser()
+        self._seen_data = False
+        self.final_urls = []
+        self.sitemap_index_urls = []
+
+    @property
+    def sitemap_lastmods(self):
+        return self._parser.sitemap_lastmods
+
+    @property
+    def url_details(self):
+        return self._parser.url_details
+
+    def feed(self, chunk):
+        data = self._decoder.decode(chunk)
+        if data:
+            self._seen_data = True
+            self._add(self._parser.feed(data))
+
+    def close(self):
+        data = self._decoder.flush()
+        if data:
+            self._seen_data = True
+            self._add(self._parser.feed(data))
+        if self._seen_data:
+            try:
+                self._add(self._parser.close())
+            except etree.XMLSyntaxError:
+                pass  # Not a sitemap at all - nothing to extract
+        return self.final_urls, self.sitemap_index_urls
+
+    def _add(self, entries):
+        for kind, loc in entries:
+            if kind == 'sitemap':
+                self.sitemap_index_urls.append(loc)
+            else:
+                self.final_urls.append(loc)
+
+def parse_sitemap_chunks(chunks, max_bytes=MAX_DECOMPRESSED_BYTES):
+    """Decompress (if gzipped) and parse an iterable of raw byte chunks in one streaming pass."""
+    body_parser = SitemapBodyParser(max_bytes)
+    for chunk in chunks:
+        body_parser.feed(chunk)
+    return body_parser.close()
+
+def _local_name(tag):
+    """Strip the namespace from an lxml tag ('{ns}loc' -> 'loc'). Comments/PIs have no name."""
+    if not isinstance(tag, str):
+        return None
+    return tag.rpartition('}')[2]
+
+class SitemapStreamParser:
+    """
+    Incremental sitemap parser built on lxml's XMLPullParser.
+
+    Feed it raw bytes as they arrive; each call returns the ('url' | 'sitemap', loc)
+    entries completed so far. Finished <url>/<sitemap> elements are cleared and
+    detached, so memory stays flat regardless of document size.
+    The <lastmod> of sitemap index entries is collected in `sitemap_lastmods`.
+
+    The optional fields of each <url> are read in the same pass, just before the
+    element is cleared, into `url_details` (loc -> dict, only for URLs that have any):
+    'lastmod', 'changefreq', 'priority' (raw text), 'hreflang' ([hreflang, href]
+    pairs from xhtml:link alternates), 'images' (image:loc list), 'videos' (dicts of
+    VIDEO_FIELDS) and 'news' (title, publication_date, publication name / language).
+    """
+
+    def __init__(self):
+        # Only <url>/<sitemap> ends are reported; their children are read from the finished element
+        self._parser = etree.XMLPullParser(
+            events=('end',), tag=('{*}url', '{*}sitemap'),
+            recover=True, huge_tree=True, resolve_entities=False, no_network=True
+        )
+        self._names = {} # lxml tag -> local name, memoized per document
+        self.sitemap_lastmods = {} # child sitemap loc -> lastmod text
+        self.url_details = {} # url loc -> optional fields
+
+    def feed(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._parser.feed(data)
+        return self._read_entries()
+
+    def close(self):
+        """Finish the document. Raises etree.XMLSyntaxError if nothing parseable was fed."""
+        self._parser.close()
+        return self._read_entries()
+
+    def _name(self, tag):
+        name = self._names.get(tag)
+        if name is None:
+            name = self._names[tag] = _local_name(tag)
+        return name
+
+    def _read_entries(self):
+        entries = []
+        for _, elem in self._parser.read_events():
+            # Only the <loc> directly under <url>/<sitemap> counts; image:loc etc. are not entries
+            if self._name(elem.tag) == 'sitemap':
+                loc = self._record_lastmod(elem)
+                if loc is not None:
+                    entries.append(('sitemap', loc))
+            else:
+                loc = self._record_details(elem)
+                if loc is not None:
+                    entries.append(('url', loc))
+            elem.clear()
+            # Detach already finished siblings so the root does not keep growing
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+        return entries
+
+    def _record_lastmod(self, sitemap_elem):
+        """Returns the entry's loc (None without one) and records its lastmod."""
+        loc = lastmod = None
+        for child in sitemap_elem:
+            child_name = self._name(child.tag)
+            if child_name == 'loc' and loc is None:
+                loc = (child.text or '').strip()
+            elif child_name == 'lastmod':
+                lastmod = (child.text or '').strip() or None
+        if loc and lastmod:
+            self.sitemap_lastmods[loc] = lastmod
+        return loc
+
+    def _record_details(self, url_elem):
+        """Returns the entry's loc (None without one) and records its optional fields."""
+        loc = None
+        details = {}
+        names = self._names
+        for child in url_elem:
+            child_name = names.get(child.tag) or self._name(child.tag)
+            if child_name == 'loc':
+                if loc is None:
+                    loc = (child.text or '').strip()
+            elif child_name in ('lastmod', 'changefreq', 'priority'):
+                text = (child.text or '').strip()
+                if text:
+                    details[child_name] = text
+            elif child_name == 'link':
+                # <xhtml:link rel="alternate" hreflang="de" href="..."/>
+                hreflang = child.get('hreflang')
+                href = (child.get('href') or '').strip()
+                if hreflang and href and 'alternate' in (child.get('rel') or '').lower().split():
+                    details.setdefault('hreflang', []).append([hreflang.strip(), href])
+            elif child_name == 'image':
+                image_loc = _child_text(child, 'loc')
+                if image_loc:
+                    details.setdefault('images', []).append(image_loc)
+            elif child_name == 'video':
+                video = {key: value for key in VIDEO_FIELDS if (value := _child_text(child, key))}
+                if video:
+                    details.setdefault('videos', []).append(video)
+            elif child_name == 'news':
+                news = {key: value for key in ('title', 'publication_date') if (value := _child_text(child, key))}
+                for publication in child:
+                    if _local_name(publication.tag) == 'publication':
+                        for key in ('name', 'language'):
+                            value = _child_text(publication, key)
+                            if value:
+                                news[key] = value
+                if news:
+                    details['news'] = news
+        if loc and details:
+            self.url_details[loc] = details
+        return loc
+
+def _child_text(elem, name):
+    """Stripped text of the first child with local name `name`, or None."""
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return (child.text or '').strip() or None
+    return None
+
+def iter_sitemap_entries(source, chunk_size=PARSE_CHUNK_SIZE):
+    """Stream ('url' | 'sitemap', loc) entries from bytes or a binary file-like object."""
+    if isinstance(source, (bytes, bytearray, str)):
+        source = io.BytesIO(source.encode('utf-8') if isinstance(source, str) else source)
+        
+    parser = SitemapStreamParser()
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+def parse_sitemap(content, engine=DEFAULT_PARSER_ENGINE):
     """Parse sitemap content and return lists of URLs and child sitemaps."""
     if not content:
         return [], []
         
+    if engine == "soup":
+        return _parse_sitemap_soup(content)
+        
+    final_urls = []
+    sitemap_index_urls = []
+    try:
+        for kind, loc in iter_sitemap_entries(content):
+            if kind == 'sitemap':
+                sitemap_index_urls.append(loc)
+            else:
+                final_urls.append(loc)
+    except etree.XMLSyntaxError:
+        # Nothing recoverable for lxml - let BeautifulSoup have a go
+        return _parse_sitemap_soup(content)
+        
+    return final_urls, sitemap_index_urls
+
+def _parse_sitemap_soup(content):
+    """Parse a whole sitemap document with BeautifulSoup (non-streaming)."""
     soup = BeautifulSoup(content, 'lxml-xml')
     
-    # Extract URLs
-    urls = [loc.text.strip() for loc in soup.find_all('loc')]
-    
     sitemap_index_urls = []
     final_urls = []
     
@@ -48,53 +417,381 @@ def parse_sitemap(content):
             
     return final_urls, sitemap_index_urls
 
-def extract_urls_recursive(url, max_urls=1000000, should_stop=None):
-    """Recursively extract URLs from a sitemap or sitemap index."""
-    all_urls = [] # List of dicts {'sitemap_url': url, 'source_sitemap': source}
-    seen_urls = set()
+class SitemapFrontier:
+    """
+    FIFO work queue of sitemaps still to crawl.
+
+    Sitemaps are deduplicated when they are pushed (not when popped), so indexes
+    that repeat children cannot blow up the queue, and push/pop are O(1).
+    Pass one into the crawlers to inspect progress while they run.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._seen = set() # Everything ever pushed: queued, in flight or done
+        self._lastmods = {} # Queued sitemap -> lastmod advertised by its parent index
+        self.popped = 0
+
+    def push(self, url, lastmod=None):
+        """Queue a sitemap unless it was seen before. Returns True if it was added."""
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        self._queue.append(url)
+        if lastmod is not None:
+            self._lastmods[url] = lastmod
+        return True
+
+    def pop(self):
+        """Take the oldest queued sitemap. Returns (url, advertised_lastmod)."""
+        url = self._queue.popleft()
+        self.popped += 1
+        return url, self._lastmods.pop(url, None)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __contains__(self, url):
+        return url in self._seen
+
+    @property
+    def discovered(self):
+        """Number of distinct sitemaps pushed so far."""
+        return len(self._seen)
+
+    def pending(self):
+        """Queued sitemaps as (url, lastmod) pairs, in pop order."""
+        return [(url, self._lastmods.get(url)) for url in self._queue]
+
+    def restore(self, pending, done=()):
+        """Reload a saved frontier: re-queue `pending` pairs and mark `done` sitemaps as seen."""
+        self._seen.update(done)
+        for url, lastmod in pending:
+            self.push(url, lastmod)
+
+def iter_sitemap_batches(url, max_urls=1000000, should_stop=None, processed_sitemaps=None, errors=None,
+                         max_sitemap_bytes=MAX_DECOMPRESSED_BYTES, cache=None, incremental=False, frontier=None,
+                         dedup=None, checkpoint=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY):
+    """
+    Crawl a sitemap or sitemap index, yielding one batch of new URL records per parsed sitemap.
+
+    `url` may also be a list of sitemap roots; they are crawled as one crawl sharing
+    the frontier and dedup set (see sitemap_discovery for finding a site's roots).
+
+    Records are dicts {'sitemap_url': url, 'source_sitemap': source} plus whichever
+    optional fields the sitemap gave for the URL (see SitemapStreamParser). Pass lists as
+    `processed_sitemaps` / `errors` to have them filled in while the crawl runs.
+    Sitemaps larger than `max_sitemap_bytes` once decompressed are reported as errors.
+    An optional SitemapCache enables conditional GETs against earlier crawls and acts
+    as the crawl manifest: with `incremental`, child sitemaps whose index <lastmod>
+    is unchanged since the last crawl are not fetched, their stored URLs are reused.
+    A SitemapFrontier passed as `frontier` can be inspected for progress.
+    `dedup` is the URL dedup backend (see url_dedup; exact in-memory set by default).
+    With a CrawlCheckpoint as `checkpoint`, the crawl state is saved every
+    `checkpoint_every` sitemaps and when the crawl ends or is stopped; if the
+    checkpoint holds an unfinished crawl of the same `url`, it is resumed from there
+    (only URLs found after the resume point are yielded).
+    """
+    if processed_sitemaps is None:
+        processed_sitemaps = [] # List for order
+    if errors is None:
+        errors = []
+    if frontier is None:
+        frontier = SitemapFrontier()
+    if dedup is None:
+        dedup = ExactDedup()
+    url_count = 0
     
-    to_process = [url]
-    processed_sitemaps = [] # List for order
-    processed_sitemaps_set = set() # Set for check
+    if checkpoint is not None:
+        url_count = _resume_from_checkpoint(checkpoint, url, frontier, processed_sitemaps, errors, dedup)
+    else:
+        _push_roots(frontier, url)
+    unsaved = [] # Records not written to the checkpoint yet
+    since_checkpoint = 0
     
+    try:
+        while frontier and url_count < max_urls:
+            if should_stop and should_stop():
+                break
+            
+            if checkpoint is not None and since_checkpoint >= checkpoint_every:
+                checkpoint.save(frontier.pending(), processed_sitemaps, errors, unsaved)
+                unsaved.clear()
+                since_checkpoint = 0
+                
+            current_sitemap, lastmod = frontier.pop()
+                
+            print(f"Processing: {current_sitemap}")
+            processed_sitemaps.append(current_sitemap)
+            since_checkpoint += 1
+            
+            urls, child_sitemaps, sitemap_lastmods, url_details, error_msg = fetch_and_parse_sitemap(
+                current_sitemap, max_sitemap_bytes, cache, lastmod, incremental
+            )
+            if error_msg:
+                errors.append(error_msg)
+                continue
+            
+            # Add found URLs
+            batch = []
+            for u in urls:
+                if dedup.add(u):
+                    batch.append({'sitemap_url': u, 'source_sitemap': current_sitemap, **url_details.get(u, _NO_DETAILS)})
+                    if url_count + len(batch) >= max_urls:
+                        break
+            url_count += len(batch)
+            
+            # Add child sitemaps to queue (ordered)
+            for child in child_sitemaps:
+                frontier.push(child, sitemap_lastmods.get(child))
+                    
+            if batch:
+                if checkpoint is not None:
+                    unsaved.extend(batch)
+                yield batch
+    finally:
+        if checkpoint is not None:
+            finished = not frontier or url_count >= max_urls
+            checkpoint.save(frontier.pending(), processed_sitemaps, errors, unsaved, finished)
+
+def _push_roots(frontier, url):
+    """Seed the frontier with one sitemap URL or a list of roots."""
+    for root in [url] if isinstance(url, str) else url:
+        frontier.push(root)
+
+def _resume_from_checkpoint(checkpoint, url, frontier, processed_sitemaps, errors, dedup):
+    """
+    Load an unfinished crawl of `url` from a checkpoint into the crawl state, or start
+    a fresh checkpoint. Returns the number of URLs already collected.
+    """
+    if not checkpoint.can_resume(url):
+        checkpoint.reset(url)
+        _push_roots(frontier, url)
+        return 0
+    processed_sitemaps.extend(checkpoint.processed_sitemaps())
+    errors.extend(checkpoint.errors())
+    frontier.restore(checkpoint.pending(), processed_sitemaps)
+    url_count = 0
+    for record in checkpoint.iter_records():
+        dedup.add(record['sitemap_url'])
+        url_count += 1
+    return url_count
+
+def iter_urls_recursive(url, **kwargs):
+    """Like iter_sitemap_batches (same arguments), but yields URL records one at a time."""
+    for batch in iter_sitemap_batches(url, **kwargs):
+        yield from batch
+
+def extract_urls_recursive(url, max_urls=1000000, should_stop=None, **kwargs):
+    """Recursively extract URLs from a sitemap or sitemap index."""
+    processed_sitemaps = []
+    errors = []
+    all_urls = list(iter_urls_recursive(
+        url, max_urls=max_urls, should_stop=should_stop,
+        processed_sitemaps=processed_sitemaps, errors=errors, **kwargs
+    ))
+    return all_urls, processed_sitemaps, errors
+
+def extract_urls_to_store(url, store=None, **kwargs):
+    """
+    Like extract_urls_recursive, but collects records into a compact UrlStore.
+
+    Takes the same keyword arguments as iter_sitemap_batches.
+    Returns (store, processed_sitemaps, errors).
+    """
+    if store is None:
+        store = UrlStore()
+    processed_sitemaps = []
     errors = []
+    for batch in iter_sitemap_batches(url, processed_sitemaps=processed_sitemaps, errors=errors, **kwargs):
+        store.extend(batch)
+    return store, processed_sitemaps, errors
+
+async def aiter_sitemap_batches(url, max_urls=1000000, should_stop=None, concurrency=DEFAULT_CONCURRENCY,
+                                processed_sitemaps=None, errors=None, max_sitemap_bytes=MAX_DECOMPRESSED_BYTES,
+                                cache=None, incremental=False, frontier=None, dedup=None,
+                                session=None, max_per_host=DEFAULT_MAX_PER_HOST,
+                                checkpoint=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY):
+    """
+    Async variant of iter_sitemap_batches that downloads child sitemaps in parallel.
+
+    Up to `concurrency` queued sitemaps are fetched ahead over one shared AsyncSession,
+    but results are consumed in queue order, so batches arrive in the same order as
+    in the sequential crawl. Pass `session` (see http_pool.create_async_session) to
+    reuse pooled connections across crawls; otherwise a session limited to
+    `max_per_host` connections per host is created and closed with the crawl.
+    With a list of roots, the roots (and then their children) share the download
+    window, so they are fetched in parallel over the same pool.
+    `checkpoint` / `checkpoint_every` work as in iter_sitemap_batches; prefetched
+    sitemaps that were still in flight are saved back as pending.
+    """
+    if processed_sitemaps is None:
+        processed_sitemaps = [] # List for order
+    if errors is None:
+        errors = []
+    if frontier is None:
+        frontier = SitemapFrontier()
+    if dedup is None:
+        dedup = ExactDedup()
+    url_count = 0
     
-    while to_process and len(all_urls) < max_urls:
-        if should_stop and should_stop():
-            break
+    if checkpoint is not None:
+        url_count = _resume_from_checkpoint(checkpoint, url, frontier, processed_sitemaps, errors, dedup)
+    else:
+        _push_roots(frontier, url)
+    in_flight = deque() # (sitemap_url, lastmod, task) in queue order
+    unsaved = [] # Records not written to the checkpoint yet
+    since_checkpoint = 0
+    
+    def pending():
+        return [(u, lastmod) for u, lastmod, _ in in_flight] + frontier.pending()
+    
+    owns_session = session is None
+    if owns_session:
+        session = create_async_session(max_clients=max(1, concurrency), max_per_host=max_per_host)
+    try:
+        while (frontier or in_flight) and url_count < max_urls:
+            if should_stop and should_stop():
+                break
             
-        current_sitemap = to_process.pop(0)
-        
-        if current_sitemap in processed_sitemaps_set:
-            continue
+            if checkpoint is not None and since_checkpoint >= checkpoint_every:
+                checkpoint.save(pending(), processed_sitemaps, errors, unsaved)
+                unsaved.clear()
+                since_checkpoint = 0
             
-        print(f"Processing: {current_sitemap}")
-        processed_sitemaps.append(current_sitemap)
-        processed_sitemaps_set.add(current_sitemap)
-        
-        content, error_msg = fetch_sitemap_content(current_sitemap)
-        if error_msg:
-            errors.append(error_msg)
-            continue
+            # Keep the download window full
+            while frontier and len(in_flight) < max(1, concurrency):
+                next_sitemap, lastmod = frontier.pop()
+                task = asyncio.ensure_future(
+                    fetch_and_parse_sitemap_async(
+                        session, next_sitemap, max_sitemap_bytes, cache, lastmod, incremental
+                    )
+                )
+                in_flight.append((next_sitemap, lastmod, task))
             
-        urls, child_sitemaps = parse_sitemap(content)
-        
-        # Add found URLs
-        for u in urls:
-            if u not in seen_urls:
-                seen_urls.add(u)
-                all_urls.append({'sitemap_url': u, 'source_sitemap': current_sitemap})
-                if len(all_urls) >= max_urls:
-                    break
-        
-        # Add child sitemaps to queue (ordered)
-        for child in child_sitemaps:
-            if child not in processed_sitemaps_set:
-                to_process.append(child)
-                
+            # Leave it queued until done, so a cancelled crawl checkpoints it as pending
+            current_sitemap, _, task = in_flight[0]
+            urls, child_sitemaps, sitemap_lastmods, url_details, error_msg = await task
+            in_flight.popleft()
+            
+            processed_sitemaps.append(current_sitemap)
+            since_checkpoint += 1
+            
+            if error_msg:
+                errors.append(error_msg)
+                continue
+            
+            # Add found URLs
+            batch = []
+            for u in urls:
+                if dedup.add(u):
+                    batch.append({'sitemap_url': u, 'source_sitemap': current_sitemap, **url_details.get(u, _NO_DETAILS)})
+                    if url_count + len(batch) >= max_urls:
+                        break
+            url_count += len(batch)
+            
+            # Add child sitemaps to queue (ordered)
+            for child in child_sitemaps:
+                frontier.push(child, sitemap_lastmods.get(child))
+                    
+            if batch:
+                if checkpoint is not None:
+                    unsaved.extend(batch)
+                yield batch
+    finally:
+        if checkpoint is not None:
+            finished = not (frontier or in_flight) or url_count >= max_urls
+            checkpoint.save(pending(), processed_sitemaps, errors, unsaved, finished)
+        # Drop prefetched sitemaps we no longer need (limit reached or stopped)
+        for _, _, task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*(task for _, _, task in in_flight), return_exceptions=True)
+        if owns_session:
+            await session.close()
+
+def resume_extract_urls(checkpoint, **kwargs):
+    """
+    Continue the unfinished crawl stored in a CrawlCheckpoint (or checkpoint file path).
+
+    Takes the same keyword arguments as iter_sitemap_batches and returns the full
+    (all_urls, processed_sitemaps, errors) triple, including what was collected
+    before the crawl was interrupted.
+    """
+    owns_checkpoint = isinstance(checkpoint, str)
+    if owns_checkpoint:
+        checkpoint = CrawlCheckpoint(checkpoint)
+    try:
+        if not checkpoint.can_resume():
+            raise ValueError(f"No unfinished crawl to resume in {checkpoint.path}")
+        all_urls = list(checkpoint.iter_records())
+        processed_sitemaps = []
+        errors = []
+        for batch in iter_sitemap_batches(
+            checkpoint.roots, processed_sitemaps=processed_sitemaps, errors=errors, checkpoint=checkpoint, **kwargs
+        ):
+            all_urls.extend(batch)
+        return all_urls, processed_sitemaps, errors
+    finally:
+        if owns_checkpoint:
+            checkpoint.close()
+
+async def aiter_urls_recursive(url, **kwargs):
+    """Like aiter_sitemap_batches (same arguments), but yields URL records one at a time."""
+    async for batch in aiter_sitemap_batches(url, **kwargs):
+        for record in batch:
+            yield record
+
+async def extract_urls_recursive_async(url, max_urls=1000000, should_stop=None, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """
+    Async variant of extract_urls_recursive that downloads child sitemaps in parallel.
+
+    Returns the same (all_urls, processed_sitemaps, errors) triple as the sequential crawl.
+    """
+    all_urls = []
+    processed_sitemaps = []
+    errors = []
+    async for batch in aiter_sitemap_batches(
+        url, max_urls=max_urls, should_stop=should_stop, concurrency=concurrency,
+        processed_sitemaps=processed_sitemaps, errors=errors, **kwargs
+    ):
+        all_urls.extend(batch)
     return all_urls, processed_sitemaps, errors
 
-def parse_uploaded_file(file_content, filename):
-    """Parse a single uploaded file (bytes)."""
-    urls, _ = parse_sitemap(file_content)
-    return [{'sitemap_url': u, 'source_sitemap': filename} for u in urls]
+async def extract_urls_to_store_async(url, store=None, **kwargs):
+    """Async variant of extract_urls_to_store; takes the same keyword arguments as aiter_sitemap_batches."""
+    if store is None:
+        store = UrlStore()
+    processed_sitemaps = []
+    errors = []
+    async for batch in aiter_sitemap_batches(url, processed_sitemaps=processed_sitemaps, errors=errors, **kwargs):
+        store.extend(batch)
+    return store, processed_sitemaps, errors
+
+async def resume_extract_urls_async(checkpoint, **kwargs):
+    """Async variant of resume_extract_urls; takes the same keyword arguments as aiter_sitemap_batches."""
+    owns_checkpoint = isinstance(checkpoint, str)
+    if owns_checkpoint:
+        checkpoint = CrawlCheckpoint(checkpoint)
+    try:
+        if not checkpoint.can_resume():
+            raise ValueError(f"No unfinished crawl to resume in {checkpoint.path}")
+        all_urls = list(checkpoint.iter_records())
+        processed_sitemaps = []
+        errors = []
+        async for batch in aiter_sitemap_batches(
+            checkpoint.roots, processed_sitemaps=processed_sitemaps, errors=errors, checkpoint=checkpoint, **kwargs
+        ):
+            all_urls.extend(batch)
+        return all_urls, processed_sitemaps, errors
+    finally:
+        if owns_checkpoint:
+            checkpoint.close()
+
+def parse_uploaded_file(file_content, filename, max_bytes=MAX_DECOMPRESSED_BYTES):
+    """Parse a single uploaded file (bytes, plain or gzipped) into crawl-style records."""
+    body_parser = SitemapBodyParser(max_bytes)
+    body_parser.feed(file_content)
+    urls, _ = body_parser.close()
+    url_details = body_parser.url_details
+    return [{'sitemap_url': u, 'source_sitemap': filename, **url_details.get(u, _NO_DETAILS)} for u in urls]
@@ -0,0 +1,529 @@
+import asyncio
+import time
+import pytest
+import seo_analyzer
+from seo_analyzer import analyze_urls, analyze_url_stream, is_backoff_signal, read_head
+from host_scheduler import HostScheduler, BASE_BACKOFF
+from head_scanner import scan_head, is_noindex, HeadParsePool, get_parse_executor
+from redirect_chain import RedirectResolver, describe_chain
+from seo_cache import SeoResultCache
+from retry_policy import RetryPolicy, classify_exception, parse_retry_after
+from curl_cffi.requests import exceptions as curl_errors
+
+
+def _patch_fetch(monkeypatch, log):
+    async def fake_fetch_url(session, url, **kwargs):
+        log.append(url)
+        await asyncio.sleep(0)
+        return {'sitemap_url': url, 'final_status': 200, 'fetch_error': None}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+
+
+def test_stream_analysis_starts_before_source_is_exhausted(monkeypatch):
+    fetched = []
+    _patch_fetch(monkeypatch, fetched)
+    seen_by_analysis_before_end = []
+
+    async def slow_source():
+        for i in range(20):
+            yield f"https://example.com/{i}"
+            await asyncio.sleep(0.001)
+        seen_by_analysis_before_end.extend(fetched)
+
+    results = asyncio.run(analyze_url_stream(slow_source(), concurrency=3, queue_size=2))
+
+    assert sorted(r['sitemap_url'] for r in results) == sorted(f"https://example.com/{i}" for i in range(20))
+    assert seen_by_analysis_before_end  # Checks ran while the source was still producing
+
+
+def test_stream_analysis_stops_without_deadlock(monkeypatch):
+    fetched = []
+    _patch_fetch(monkeypatch, fetched)
+
+    async def endless_source():
+        i = 0
+        while True:
+            yield f"https://example.com/{i}"
+            i += 1
+
+    results = asyncio.run(analyze_url_stream(endless_source(), should_stop=lambda: len(fetched) >= 10,
+                                             concurrency=2, queue_size=4))
+    assert 10 <= len(results) < 20
+
+
+def test_host_scheduler_caps_each_host_separately():
+    scheduler = HostScheduler(max_total=10, initial_per_host=2, max_per_host=2)
+    active = {}
+    peak = {}
+
+    async def request(url):
+        host = await scheduler.acquire(url)
+        active[host] = active.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), active[host])
+        await asyncio.sleep(0.001)
+        active[host] -= 1
+        scheduler.release(host)
+
+    async def main():
+        urls = [f"https://{host}/{i}" for i in range(10) for host in ("a.example", "b.example", "c.example")]
+        await asyncio.gather(*(request(url) for url in urls))
+
+    asyncio.run(main())
+    assert peak == {"a.example": 2, "b.example": 2, "c.example": 2}
+    assert scheduler.active == 0
+
+
+def test_host_scheduler_aimd_limits():
+    scheduler = HostScheduler(initial_per_host=4, max_per_host=8)
+
+    async def one(congested):
+        host = await scheduler.acquire("https://a.example/")
+        scheduler.release(host, congested)
+
+    async def main():
+        for _ in range(20):
+            await one(False)
+        grown = scheduler.limit("a.example")
+        await one(True)
+        await one(True)  # Within the cooldown: counts once
+        return grown
+
+    grown = asyncio.run(main())
+    assert 4 < grown <= 8
+    assert scheduler.limit("a.example") == grown / 2
+
+
+def test_host_scheduler_counts_a_burst_of_congestion_once():
+    scheduler = HostScheduler(initial_per_host=16, max_per_host=16)
+
+    async def main():
+        hosts = [await scheduler.acquire(f"https://a.example/{i}") for i in range(10)]
+        start = time.monotonic()
+        for host in hosts:  # Ten in-flight requests all answer 429 at once
+            scheduler.release(host, congested=True)
+        return start
+
+    start = asyncio.run(main())
+    paused_until = scheduler._hosts["a.example"].paused_until
+    assert start + BASE_BACKOFF <= paused_until < start + BASE_BACKOFF + 0.1
+    assert scheduler._hosts["a.example"].strikes == 1
+
+    async def retry_after():
+        host = await scheduler.acquire("https://b.example/")
+        scheduler.release(host, congested=True, retry_after=3)
+
+    asyncio.run(retry_after())
+    assert 2.9 < scheduler._hosts["b.example"].paused_until - time.monotonic() <= 3
+
+    async def long_retry_after():  # Longer than the congestion backoff cap, within RetryPolicy's
+        host = await scheduler.acquire("https://c.example/")
+        scheduler.release(host, congested=True, retry_after=90)
+
+    asyncio.run(long_retry_after())
+    assert 89.9 < scheduler._hosts["c.example"].paused_until - time.monotonic() <= 90
+
+
+def test_backoff_signals():
+    base = {'final_status': 200, 'fetch_error': None}
+    assert not is_backoff_signal(base)
+    assert is_backoff_signal({**base, 'final_status': 429})
+    assert is_backoff_signal({**base, 'final_status': 503})
+    assert is_backoff_signal({'final_status': None, 'fetch_error': "RequestError: Operation timed out after 10001 ms"})
+    assert not is_backoff_signal({**base, 'final_status': 404})
+
+
+def test_analyze_urls_uses_fixed_worker_pool_and_stops_instantly(monkeypatch):
+    peak_tasks = []
+
+    async def hanging_fetch_url(session, url, **kwargs):
+        peak_tasks.append(len(asyncio.all_tasks()))
+        await asyncio.sleep(10)
+        return {'sitemap_url': url, 'final_status': 200, 'fetch_error': None}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", hanging_fetch_url)
+    started = time.monotonic()
+    urls = [f"https://a{i % 50}.example/{i}" for i in range(10000)]
+    results = asyncio.run(analyze_urls(urls, should_stop=lambda: time.monotonic() - started > 0.2, concurrency=8))
+
+    assert results == []
+    assert time.monotonic() - started < 2  # In-flight requests were cancelled, not awaited
+    assert max(peak_tasks) < 20  # Workers + pool + watcher, not one task per URL
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.consumed = 0
+
+    async def aiter_content(self):
+        for chunk in self.chunks[self.consumed:]:  # A second read resumes where the first stopped
+            self.consumed += 1
+            yield chunk
+
+
+def test_read_head_stops_at_head_end_across_chunks():
+    stream = _FakeStream([b"<html><head><title>x</title></HE", b"AD ><body>", b"never read"])
+    body = asyncio.run(read_head(stream))
+    assert bytes(body) == b"<html><head><title>x</title></HEAD >"
+    assert stream.consumed == 2
+
+
+def test_read_head_trims_to_cap_exactly():
+    stream = _FakeStream([b"a" * 700] * 10)
+    body = asyncio.run(read_head(stream, max_bytes=1000))
+    assert len(body) == 1000
+    assert stream.consumed == 2
+
+
+def test_scan_head_extracts_seo_tags():
+    page = b"""<!DOCTYPE html><html><HEAD>
+    <!-- <link rel="canonical" href="https://example.com/commented"> -->
+    <script>var s = '<meta name="robots" content="noindex">';</script>
+    <Title> Hello &amp;
+      world </Title>
+    <meta name="ROBOTS" content="index, follow">
+    <meta name=googlebot content='NoIndex'>
+    <link rel="alternate" hreflang="de" href="https://example.com/de">
+    <link REL="Canonical  Alternate" href="https://example.com/page?a=1&amp;b=2">
+    <link rel="canonical" href="https://example.com/second">
+    </head><body><link rel="canonical" href="https://example.com/body"></body></html>"""
+    head = scan_head(page)
+
+    assert head["title"] == "Hello & world"
+    assert head["robots"] == ["index, follow"]
+    assert head["googlebot"] == ["NoIndex"]
+    assert head["canonical"] == "https://example.com/page?a=1&b=2"
+    assert head["hreflang"] == [["de", "https://example.com/de"]]
+    assert is_noindex(head)
+    assert not is_noindex(scan_head('<meta name="robots" content="index,nofollow"><meta name="robots" content="noarchive">'))
+    assert is_noindex(scan_head('<meta content="none" name="robots">'))
+
+
+def test_head_parse_pool_matches_inline_scan():
+    heads = [f'<head><title>Page {i}</title><link rel="canonical" href="https://example.com/{i}"></head>'.encode()
+             for i in range(40)]
+
+    async def main():
+        pool = HeadParsePool(processes=2, batch_size=16)
+        try:
+            return await asyncio.gather(*(pool.parse(head) for head in heads))
+        finally:
+            pool.close()
+
+    assert asyncio.run(main()) == [scan_head(head) for head in heads]
+    # Worker processes are started once and reused by later runs
+    assert asyncio.run(main()) == [scan_head(head) for head in heads]
+    assert HeadParsePool(processes=2)._executor is get_parse_executor(2)
+    assert get_parse_executor(2)._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+class _FakeResponse(_FakeStream):
+    def __init__(self, status, headers, chunks=()):
+        super().__init__(list(chunks))
+        self.status_code = status
+        self.headers = headers
+        self.quit_now = asyncio.Event()
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _FakeSession:
+    def __init__(self, response, head_response=None):
+        self.response = response
+        self.head_response = head_response
+        self.methods = []
+
+    async def get(self, url, **kwargs):
+        self.methods.append("GET")
+        return self.response
+
+    async def head(self, url, **kwargs):
+        self.methods.append("HEAD")
+        return self.head_response
+
+
+def test_fetch_url_closes_streams_and_aborts_unparsed_bodies():
+    def fetch(response):
+        result = asyncio.run(seo_analyzer.fetch_url(_FakeSession(response), "https://example.com/a"))
+        assert response.closed
+        return result
+
+    pdf = _FakeResponse(200, {"Content-Type": "application/pdf", "Content-Length": "100"}, [b"%PDF"])
+    assert fetch(pdf)["final_status"] == 200
+    assert pdf.quit_now.is_set() and pdf.consumed == 0
+
+    redirect = _FakeResponse(301, {"Location": "https://example.com/b", "Content-Length": "0"})
+    assert fetch(redirect)["redirect_location"] == "https://example.com/b"
+    assert not redirect.quit_now.is_set()  # Tiny body: drained, connection reused
+
+    big_page = _FakeResponse(200, {"Content-Type": "text/html", "Content-Length": "500000"},
+                             [b"<head><title>t</title></head>", b"<body>never read"])
+    assert fetch(big_page)["title"] == "t"
+    assert big_page.quit_now.is_set() and big_page.consumed == 1
+
+    small_page = _FakeResponse(200, {"Content-Type": "text/html", "Content-Length": "40"},
+                               [b"<head><title>t</title></head>"])
+    fetch(small_page)
+    assert not small_page.quit_now.is_set()
+
+    # Chunked (no Content-Length): the rest is drained up to DRAIN_LIMIT, aborted past it
+    chunked_page = _FakeResponse(200, {"Content-Type": "text/html"},
+                                 [b"<head><title>t</title></head>", b"<body>" + b"x" * 1000, b"</body>"])
+    fetch(chunked_page)
+    assert not chunked_page.quit_now.is_set() and chunked_page.consumed == 3
+
+    long_page = _FakeResponse(200, {"Content-Type": "text/html"},
+                              [b"<head><title>t</title></head>"] + [b"x" * 8192] * 10)
+    fetch(long_page)
+    assert long_page.quit_now.is_set() and long_page.consumed == 4  # Head, then 3 chunks > 16 KB
+
+
+def test_head_first_only_gets_html_pages_that_need_checks():
+    def run(head, check_html=True):
+        page = _FakeResponse(200, {"Content-Type": "text/html"}, [b"<head><title>t</title></head>"])
+        session = _FakeSession(page, head)
+        result = asyncio.run(seo_analyzer.fetch_url(session, "https://example.com/a", head_first=True,
+                                                    check_html=check_html))
+        return result, session.methods
+
+    html_head = _FakeResponse(200, {"Content-Type": "text/html; charset=utf-8", "X-Robots-Tag": "noindex"})
+    result, methods = run(html_head, check_html=False)
+    assert methods == ["HEAD"]
+    assert result["final_status"] == 200 and result["noindex_source"] == "Header" and result["title"] is None
+
+    result, methods = run(html_head)
+    assert methods == ["HEAD", "GET"] and result["title"] == "t"
+    assert result["noindex_source"] is None  # Taken from the GET response, not the HEAD one
+
+    assert run(_FakeResponse(200, {"Content-Type": "image/png"}))[1] == ["HEAD"]
+    assert run(_FakeResponse(404, {"Content-Type": "text/html"}))[1] == ["HEAD"]
+    result, methods = run(_FakeResponse(405, {}))  # Server refuses HEAD: fall back to GET
+    assert methods == ["HEAD", "GET"] and result["final_status"] == 200
+
+
+def test_redirect_resolver_follows_each_target_once():
+    site = {
+        "https://example.com/old": (301, "/new"),
+        "https://example.com/new": (302, "https://www.example.com/new"),
+        "https://www.example.com/new": (200, None),
+        "https://example.com/loop": (301, "https://example.com/loop2"),
+        "https://example.com/loop2": (301, "/loop"),
+    }
+    probed = []
+
+    async def probe(url):
+        probed.append(url)
+        await asyncio.sleep(0.01)
+        return site[url]
+
+    async def main():
+        resolver = RedirectResolver(probe, max_hops=5)
+        try:
+            chains = await asyncio.gather(*(resolver.resolve("https://example.com/old") for _ in range(50)))
+            loop = await resolver.resolve("https://example.com/loop")
+            short = await RedirectResolver(probe, max_hops=2).resolve("https://example.com/old")
+            return chains, loop, short
+        finally:
+            await resolver.aclose()
+
+    chains, loop, short = asyncio.run(main())
+    assert probed.count("https://example.com/old") == 2  # Once for the shared resolver, once for `short`
+    chain = chains[0]
+    assert chain["final_url"] == "https://www.example.com/new" and chain["final_status"] == 200
+    assert describe_chain("https://example.com/a", 301, chain) == (
+        "301 https://example.com/a -> 301 https://example.com/old -> 302 https://example.com/new"
+        " -> 200 https://www.example.com/new"
+    )
+    assert loop["error"] == "Redirect loop" and loop["final_status"] is None
+    assert short["error"] == "Too many redirects" and len(short["hops"]) == 2
+
+
+def test_redirect_hops_are_probed_once_through_scheduler_and_retries(monkeypatch):
+    site = {
+        "https://a.example/r3": (301, "https://a.example/r2"),
+        "https://a.example/r2": (301, "https://b.example/r1"),
+        "https://b.example/r1": (302, "/page"),
+        "https://b.example/page": (200, None),
+    }
+    fetched = []
+
+    async def fake_fetch_url(session, url, **kwargs):
+        fetched.append(url)
+        if url == "https://b.example/page" and fetched.count(url) == 1:
+            return {"sitemap_url": url, "final_status": 429, "fetch_error": None, "retry_after": 0.01}
+        status, location = site[url]
+        return {"sitemap_url": url, "final_status": status, "fetch_error": None, "redirect_location": location}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+    acquired = []
+    acquire = HostScheduler.acquire
+
+    async def counting_acquire(self, url):
+        acquired.append(url)
+        return await acquire(self, url)
+
+    monkeypatch.setattr(HostScheduler, "acquire", counting_acquire)
+    results = asyncio.run(analyze_urls(["https://a.example/r3", "https://a.example/r2"], concurrency=1,
+                                       max_redirects=5))
+
+    by_url = {r["sitemap_url"]: r for r in results}
+    assert by_url["https://a.example/r3"]["redirect_final_status"] == 200
+    assert by_url["https://a.example/r2"]["redirect_hops"] == 2
+    # Shared tail probed once (the page twice: its 429 was retried); every request took a scheduler slot
+    assert sorted(fetched) == sorted(["https://a.example/r3", "https://a.example/r2", "https://a.example/r2",
+                                      "https://b.example/r1", "https://b.example/page", "https://b.example/page"])
+    assert sorted(acquired) == sorted(fetched)
+
+
+def test_retry_policy_classifies_and_budgets():
+    assert classify_exception(curl_errors.ConnectTimeout("t")) == "timeout"
+    assert classify_exception(curl_errors.DNSError("d")) == "dns"
+    assert classify_exception(curl_errors.CertificateVerifyError("c")) == "tls"
+    assert classify_exception(curl_errors.ConnectionError("c")) == "connection"
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480) == 10.0
+    assert parse_retry_after("soon") is None
+
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, budget_min=2, budget_ratio=0)
+    timeout = {"final_status": None, "fetch_error": "Timeout", "error_type": "timeout"}
+    assert policy.next_delay("a", 1, {"final_status": 404, "fetch_error": None}) is None
+    assert policy.next_delay("a", 1, {"final_status": None, "fetch_error": "x", "error_type": "dns"}) is None
+    assert 0 <= policy.next_delay("a", 1, timeout) <= 1.0
+    assert policy.next_delay("a", 3, timeout) is None  # Out of attempts
+    assert policy.next_delay("a", 2, {"final_status": 429, "fetch_error": None}, retry_after=5) == 5
+    assert policy.next_delay("a", 1, timeout) is None  # Host budget spent
+    assert policy.next_delay("b", 1, timeout) is not None
+
+
+def test_unexpected_fetch_error_is_raised_instead_of_hanging(monkeypatch):
+    async def fake_fetch_url(session, url, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+    urls = [f"https://example.com/{i}" for i in range(10)]
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(asyncio.wait_for(analyze_urls(urls, concurrency=2), 5))
+
+
+def test_retries_wait_without_holding_a_worker(monkeypatch):
+    order = []
+    tries = {}
+
+    async def fake_fetch_url(session, url, **kwargs):
+        tries[url] = tries.get(url, 0) + 1
+        order.append(url)
+        if url.endswith("/limited") and tries[url] == 1:
+            return {"sitemap_url": url, "final_status": 429, "fetch_error": None, "retry_after": 0.2}
+        return {"sitemap_url": url, "final_status": 200, "fetch_error": None}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+    urls = ["https://a.example/limited"] + [f"https://b.example/{i}" for i in range(5)]
+    results = asyncio.run(analyze_urls(urls, concurrency=1))
+
+    assert order[-1] == "https://a.example/limited"  # Retried after the others, not before
+    by_url = {r["sitemap_url"]: r for r in results}
+    assert by_url["https://a.example/limited"]["attempts"] == 2
+    assert by_url["https://a.example/limited"]["final_status"] == 200
+    assert all("retry_after" not in r for r in results)
+
+
+def test_retry_after_pauses_the_host_for_the_retry_delay(monkeypatch):
+    async def fake_fetch_url(session, url, **kwargs):
+        return {"sitemap_url": url, "final_status": 429, "fetch_error": None, "retry_after": 4.0}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+    scheduler = HostScheduler()
+    policy = RetryPolicy(base_delay=0.01)
+    start = time.monotonic()
+    res, delay = asyncio.run(seo_analyzer.attempt_fetch(policy, scheduler, None, "https://a.example/", 1))
+
+    assert delay == 4.0
+    assert start + 4.0 <= scheduler._hosts["a.example"].paused_until < start + 4.1
+
+
+def test_fetch_url_records_timings_and_bytes():
+    page = _FakeResponse(200, {"Content-Type": "text/html"}, [b"<head><title>t</title>", b"</head><body>"])
+    page.infos = dict(zip(seo_analyzer.TIMING_INFOS, (0.010, 0.030, 0.080, 0.120)))
+    result = asyncio.run(seo_analyzer.fetch_url(_FakeSession(page), "https://example.com/a"))
+
+    assert (result["dns_ms"], result["connect_ms"], result["tls_ms"], result["ttfb_ms"]) == (10.0, 20.0, 50.0, 120.0)
+    assert result["bytes_received"] == 35
+    assert result["total_ms"] >= 0
+
+    reused = _FakeResponse(200, {"Content-Type": "image/png"})
+    reused.infos = dict(zip(seo_analyzer.TIMING_INFOS, (0.0, 0.0, 0.0, 0.040)))
+    result = asyncio.run(seo_analyzer.fetch_url(_FakeSession(reused), "https://example.com/b.png"))
+    assert (result["dns_ms"], result["connect_ms"], result["tls_ms"], result["bytes_received"]) == (0.0, 0.0, 0.0, 0)
+
+
+def test_result_cache_skips_fresh_urls_and_revalidates_stale_ones(monkeypatch, tmp_path):
+    requests = []
+
+    async def fake_fetch_url(session, url, conditional=None, **kwargs):
+        requests.append((url, conditional))
+        if conditional and conditional.get("If-None-Match") == '"v1"':
+            return {"sitemap_url": url, "final_status": 304, "fetch_error": None, "total_ms": 1.0,
+                    "validators": ('"v1"', None)}
+        return {"sitemap_url": url, "final_status": 200, "fetch_error": None, "title": "Page", "total_ms": 9.0,
+                "validators": ('"v1"', None)}
+
+    monkeypatch.setattr(seo_analyzer, "fetch_url", fake_fetch_url)
+    urls = ["https://example.com/a", "https://example.com/b"]
+    with SeoResultCache(str(tmp_path / "seo.sqlite3")) as cache:
+        first = asyncio.run(analyze_urls(urls, cache=cache))
+        assert {r["cache_status"] for r in first} == {"fetched"}
+        assert all("validators" not in r for r in first)
+
+        cached = asyncio.run(analyze_urls(urls, cache=cache))
+        assert len(requests) == 2  # Fresh: no new requests
+        assert {(r["cache_status"], r["title"], r["total_ms"], r["attempts"]) for r in cached} == {
+            ("cached", "Page", None, None)
+        }
+
+        revalidated = asyncio.run(analyze_urls(urls, cache=cache, cache_ttl=0))
+        assert [c for _, c in requests[2:]] == [{"If-None-Match": '"v1"'}] * 2
+        assert {(r["cache_status"], r["final_status"], r["title"], r["total_ms"]) for r in revalidated} == {
+            ("not_modified", 200, "Page", 1.0)
+        }
+
+        status_only = asyncio.run(analyze_urls(urls, cache=cache, check_html=False))
+        assert {r["cache_status"] for r in status_only} == {"fetched"}  # Other check options: not reused
+        assert requests[-1][1] == {}
+
+
+def test_result_cache_buffers_writes_until_flushed(tmp_path):
+    path = str(tmp_path / "seo.sqlite3")
+    with SeoResultCache(path) as cache, SeoResultCache(path) as reader:
+        cache.put("https://example.com/a", "p", {"title": "A"}, '"v1"', None)
+        assert cache.get("https://example.com/a", "p")["result"] == {"title": "A"}  # Visible before the write
+        assert cache.get("https://example.com/a", "other") is None
+        assert reader.get("https://example.com/a", "p") is None
+
+        cache.flush()
+        entry = reader.get("https://example.com/a", "p")
+        assert (entry["result"], entry["etag"]) == ({"title": "A"}, '"v1"')
+
+        cache.touch("https://example.com/a")
+        assert cache.get("https://example.com/a", "p")["checked_at"] > entry["checked_at"]
+        assert reader.get("https://example.com/a", "p")["checked_at"] == entry["checked_at"]
+
+
+def test_head_parse_pool_fails_batches_when_the_executor_is_broken():
+    class BrokenExecutor:
+        def submit(self, *args):
+            raise RuntimeError("pool is broken")
+
+    async def main():
+        pool = HeadParsePool(processes=1, batch_size=2)
+        pool._executor = BrokenExecutor()
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(pool.parse(b"<head>"), pool.parse(b"<head>"), return_exceptions=True), 5
+            )
+        finally:
+            pool.close()
+
+    assert [str(e) for e in asyncio.run(main())] == ["pool is broken"] * 2
@@ -0,0 +1,502 @@
+import asyncio
+import gzip
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import pytest
+import sitemap_parser
+from sitemap_cache import SitemapCache, conditional_headers
+from url_dedup import BloomDedup, make_dedup
+from crawl_checkpoint import CrawlCheckpoint
+from url_store import UrlStore
+from sitemap_discovery import parse_robots_sitemaps, site_root
+from sitemap_parser import parse_sitemap, extract_urls_recursive, extract_urls_recursive_async
+from curl_cffi.requests import Session
+
+
+def _index(*locs):
+    entries = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'.encode()
+
+
+def _urlset(*locs):
+    entries = "".join(f"<url><loc>{loc}</loc></url>" for loc in locs)
+    return f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode()
+
+
+# Small fake site: an index that repeats a child and nests another index
+SITE = {
+    "https://example.com/sitemap.xml": _index(
+        "https://example.com/a.xml", "https://example.com/nested.xml", "https://example.com/a.xml", "https://example.com/missing.xml"
+    ),
+    "https://example.com/a.xml": _urlset("https://example.com/1", "https://example.com/2"),
+    "https://example.com/nested.xml": _index("https://example.com/b.xml", "https://example.com/a.xml"),
+    "https://example.com/b.xml": _urlset("https://example.com/2", "https://example.com/3"),
+}
+
+
+def _fake_fetch(url):
+    if url in SITE:
+        return SITE[url], None
+    return None, f"Error fetching {url}: 404"
+
+
+def _fake_fetch_and_parse(url, *args):
+    content, error_msg = _fake_fetch(url)
+    if error_msg:
+        return [], [], {}, {}, error_msg
+    return (*parse_sitemap(content), {}, {}, None)
+
+
+def _patch_fetch(monkeypatch):
+    async def fake_fetch_and_parse_async(session, url, *args):
+        # Finish out of order to prove results are still consumed in queue order
+        await asyncio.sleep(0.01 if url.endswith("a.xml") else 0)
+        return _fake_fetch_and_parse(url)
+
+    monkeypatch.setattr(sitemap_parser, "fetch_and_parse_sitemap", _fake_fetch_and_parse)
+    monkeypatch.setattr(sitemap_parser, "fetch_and_parse_sitemap_async", fake_fetch_and_parse_async)
+
+
+def test_parse_sitemap_splits_urls_and_children():
+    urls, children = parse_sitemap(SITE["https://example.com/sitemap.xml"])
+    assert urls == []
+    assert children[:2] == ["https://example.com/a.xml", "https://example.com/nested.xml"]
+
+    urls, children = parse_sitemap(SITE["https://example.com/a.xml"])
+    assert urls == ["https://example.com/1", "https://example.com/2"]
+    assert children == []
+
+
+def test_async_crawl_matches_sequential_crawl(monkeypatch):
+    _patch_fetch(monkeypatch)
+    root = "https://example.com/sitemap.xml"
+
+    expected = extract_urls_recursive(root)
+    result = asyncio.run(extract_urls_recursive_async(root, concurrency=3))
+
+    assert result == expected
+    all_urls, processed, errors = result
+    assert [u["sitemap_url"] for u in all_urls] == ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+    assert all_urls[2]["source_sitemap"] == "https://example.com/b.xml"
+    assert len(processed) == len(set(processed)) == 5
+    assert errors == ["Error fetching https://example.com/missing.xml: 404"]
+
+
+def test_async_crawl_respects_max_urls(monkeypatch):
+    _patch_fetch(monkeypatch)
+    all_urls, _, _ = asyncio.run(extract_urls_recursive_async("https://example.com/sitemap.xml", max_urls=1))
+    assert [u["sitemap_url"] for u in all_urls] == ["https://example.com/1"]
+
+
+def test_stream_engine_matches_soup_engine():
+    content = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+        b'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">'
+        b'<url><loc> https://example.com/1 </loc>'
+        b'<image:image><image:loc>https://example.com/img.jpg</image:loc></image:image></url>'
+        b'<!-- comment --><url><loc><![CDATA[https://example.com/2?a=1&b=2]]></loc></url>'
+        b'</urlset>'
+    )
+    expected = (["https://example.com/1", "https://example.com/2?a=1&b=2"], [])
+    assert parse_sitemap(content, engine="stream") == expected
+    assert parse_sitemap(content, engine="soup") == expected
+
+
+def test_stream_parser_handles_split_chunks():
+    content = _urlset(*[f"https://example.com/{i}" for i in range(500)])
+    entries = list(sitemap_parser.iter_sitemap_entries(content, chunk_size=7))
+    assert entries == [("url", f"https://example.com/{i}") for i in range(500)]
+
+
+def test_batch_generators_yield_per_sitemap(monkeypatch):
+    _patch_fetch(monkeypatch)
+    root = "https://example.com/sitemap.xml"
+
+    processed = []
+    batches = list(sitemap_parser.iter_sitemap_batches(root, processed_sitemaps=processed))
+    assert [[r["sitemap_url"] for r in b] for b in batches] == [
+        ["https://example.com/1", "https://example.com/2"],
+        ["https://example.com/3"],
+    ]
+    assert processed[0] == root
+
+    async def collect():
+        return [record async for record in sitemap_parser.aiter_urls_recursive(root)]
+
+    assert asyncio.run(collect()) == [record for batch in batches for record in batch]
+
+
+def test_body_parser_streams_gzip_in_small_chunks():
+    content = _urlset(*[f"https://example.com/{i}" for i in range(200)])
+    # Two gzip members, like `cat a.gz b.gz`, split into tiny network chunks
+    compressed = gzip.compress(content[:1000]) + gzip.compress(content[1000:])
+    chunks = [compressed[i:i + 5] for i in range(0, len(compressed), 5)]
+
+    urls, children = sitemap_parser.parse_sitemap_chunks(chunks)
+
+    assert urls == [f"https://example.com/{i}" for i in range(200)]
+    assert children == []
+    assert sitemap_parser.parse_uploaded_file(compressed, "upload.xml.gz")[0] == {
+        'sitemap_url': "https://example.com/0", 'source_sitemap': "upload.xml.gz"
+    }
+
+
+def test_body_parser_caps_decompressed_size():
+    bomb = gzip.compress(b"<urlset>" + b" " * 10_000_000 + b"</urlset>")
+    decoder = sitemap_parser.SitemapBodyDecoder(max_bytes=1024)
+    with pytest.raises(sitemap_parser.SitemapTooLargeError):
+        decoder.decode(bomb)
+    assert decoder.total_bytes == 1025  # Stopped inflating right past the cap
+
+    with pytest.raises(sitemap_parser.SitemapTooLargeError):
+        sitemap_parser.parse_sitemap_chunks([b"<urlset>", b"x" * 2048], max_bytes=1024)
+
+
+@pytest.fixture
+def sitemap_server(monkeypatch):
+    """
+    Serve {path: body} from a local HTTP server; get_session() returns a fresh Session for it.
+
+    Bodies carry an ETag and a matching If-None-Match is answered with 304. Every
+    request is logged as (path, status).
+    """
+    pages = {}
+    log = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = pages.get(self.path)
+            etag = f'"{zlib.crc32(body)}"' if body is not None else None
+            status = 404 if body is None else 304 if self.headers.get("If-None-Match") == etag else 200
+            log.append((self.path, status))
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+            if status == 304:
+                self.end_headers()
+                return
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    session = Session()
+    monkeypatch.setattr(sitemap_parser, "get_session", lambda: session)
+    yield pages, f"http://127.0.0.1:{server.server_port}", log
+    session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_and_parse_sitemap_streams_into_parser(sitemap_server, monkeypatch):
+    pages, base, _ = sitemap_server
+    locs = [f"https://example.com/{i}" for i in range(20000)]  # Large enough to arrive in several chunks
+    pages["/sitemap.xml"] = _urlset(*locs)
+    pages["/sitemap.xml.gz"] = gzip.compress(_urlset(*locs))
+    chunks = []
+    feed = sitemap_parser.SitemapBodyParser.feed
+
+    def counting_feed(self, chunk):
+        chunks.append(len(chunk))
+        feed(self, chunk)
+
+    monkeypatch.setattr(sitemap_parser.SitemapBodyParser, "feed", counting_feed)
+    for path in ("/sitemap.xml", "/sitemap.xml.gz"):
+        chunks.clear()
+        urls, children, _, _, error = sitemap_parser.fetch_and_parse_sitemap(base + path)
+        assert error is None and children == [] and urls == locs
+        assert sum(chunks) == len(pages[path])
+    assert len(chunks) > 1  # Fed chunk by chunk from curl's write callback, not as one body
+
+    urls, _, _, _, error = sitemap_parser.fetch_and_parse_sitemap(base + "/sitemap.xml", max_bytes=1024)
+    assert urls == []
+    assert "exceeds 1024 bytes" in error
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_repeat_crawl_revalidates_sitemaps_with_the_cache(use_async, sitemap_server, tmp_path):
+    pages, base, log = sitemap_server
+    pages["/sitemap.xml"] = _index(base + "/a.xml", base + "/b.xml")
+    pages["/a.xml"] = _urlset("https://example.com/1", "https://example.com/2")
+    pages["/b.xml"] = _urlset("https://example.com/3")
+
+    def crawl(cache):
+        if use_async:
+            return asyncio.run(sitemap_parser.extract_urls_recursive_async(base + "/sitemap.xml", cache=cache))
+        return extract_urls_recursive(base + "/sitemap.xml", cache=cache)
+
+    with SitemapCache(str(tmp_path / "cache.sqlite3")) as cache:
+        first = crawl(cache)
+        assert sorted(status for _, status in log) == [200, 200, 200]
+        log.clear()
+        second = crawl(cache)
+
+    # Every sitemap was asked with If-None-Match, answered 304 without a body, and parsed from the cache
+    assert sorted(log) == [("/a.xml", 304), ("/b.xml", 304), ("/sitemap.xml", 304)]
+    urls = sorted(record['sitemap_url'] for record in second[0])
+    assert urls == sorted(record['sitemap_url'] for record in first[0])
+    assert urls == ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+    assert second[2] == []
+
+
+def test_sitemap_cache_round_trip(tmp_path):
+    with SitemapCache(str(tmp_path / "cache.sqlite3")) as cache:
+        assert cache.get("https://example.com/a.xml") is None
+        cache.put("https://example.com/a.xml", '"v1"', None, ["https://example.com/1"], ["https://example.com/b.xml"])
+        entry = cache.get("https://example.com/a.xml")
+
+    assert entry['urls'] == ["https://example.com/1"]
+    assert entry['child_sitemaps'] == ["https://example.com/b.xml"]
+    assert conditional_headers(entry) == {'If-None-Match': '"v1"'}
+    assert conditional_headers(None) == {}
+
+
+def test_stream_parser_records_index_lastmods():
+    content = (
+        b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        b'<sitemap><lastmod>2024-05-01</lastmod><loc>https://example.com/a.xml</loc></sitemap>'
+        b'<sitemap><loc>https://example.com/b.xml</loc></sitemap>'
+        b'</sitemapindex>'
+    )
+    body_parser = sitemap_parser.SitemapBodyParser()
+    body_parser.feed(content)
+    assert body_parser.close() == ([], ["https://example.com/a.xml", "https://example.com/b.xml"])
+    assert body_parser.sitemap_lastmods == {"https://example.com/a.xml": "2024-05-01"}
+
+
+def test_incremental_fetch_skips_unchanged_lastmod(tmp_path):
+    # Nothing listens on port 9, so any real request fails
+    url = "http://127.0.0.1:9/sitemap-products.xml"
+    with SitemapCache(str(tmp_path / "cache.sqlite3")) as cache:
+        cache.put(url, None, None, ["https://example.com/p1"], [], index_lastmod="2024-05-01")
+
+        urls, children, _, _, error_msg = sitemap_parser.fetch_and_parse_sitemap(
+            url, cache=cache, lastmod="2024-05-01", trust_lastmod=True
+        )
+        assert (urls, children, error_msg) == (["https://example.com/p1"], [], None)
+
+        _, _, _, _, error_msg = sitemap_parser.fetch_and_parse_sitemap(
+            url, cache=cache, lastmod="2024-06-01", trust_lastmod=True
+        )
+        assert error_msg.startswith(f"Error fetching {url}")
+
+
+def test_frontier_dedupes_at_enqueue():
+    frontier = sitemap_parser.SitemapFrontier()
+    assert frontier.push("https://example.com/a.xml", "2024-05-01")
+    assert frontier.push("https://example.com/b.xml")
+    assert not frontier.push("https://example.com/a.xml", "2024-06-01")
+    assert (len(frontier), frontier.discovered) == (2, 2)
+
+    assert frontier.pop() == ("https://example.com/a.xml", "2024-05-01")
+    assert not frontier.push("https://example.com/a.xml")  # Done sitemaps stay deduped
+    assert frontier.pop() == ("https://example.com/b.xml", None)
+    assert not frontier and frontier.popped == 2
+
+
+def test_extract_urls_to_store_matches_record_lists(monkeypatch):
+    _patch_fetch(monkeypatch)
+    root = "https://example.com/sitemap.xml"
+
+    all_urls, processed, errors = extract_urls_recursive(root)
+    store, store_processed, store_errors = sitemap_parser.extract_urls_to_store(root)
+
+    assert list(store) == all_urls
+    assert (store_processed, store_errors) == (processed, errors)
+
+    df = store.to_dataframe()
+    assert df['sitemap_url'].tolist() == [u['sitemap_url'] for u in all_urls]
+    assert df['source_sitemap'].tolist() == [u['source_sitemap'] for u in all_urls]
+    assert str(df['source_sitemap'].dtype) == 'category'
+
+
+@pytest.mark.parametrize("mode", ["exact", "bloom", "disk"])
+def test_dedup_backends_drop_repeats(mode, monkeypatch):
+    _patch_fetch(monkeypatch)
+    dedup = make_dedup(mode, capacity=1000)
+    try:
+        all_urls, _, _ = extract_urls_recursive("https://example.com/sitemap.xml", dedup=dedup)
+        assert [u["sitemap_url"] for u in all_urls] == ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+        assert len(dedup) == 3
+    finally:
+        dedup.close()
+
+
+def test_bloom_dedup_false_positive_rate_is_bounded():
+    bloom = BloomDedup(capacity=20000, error_rate=0.01)
+    added = sum(bloom.add(f"https://example.com/seen/{i}") for i in range(0, 20000, 2))
+    assert added > 10000 * 0.99
+    assert not any(bloom.add(f"https://example.com/seen/{i}") for i in range(0, 20000, 2))
+    false_positives = sum(not bloom.add(f"https://example.com/new/{i}") for i in range(10000))
+    assert false_positives < 10000 * 0.01 * 2
+    assert bloom.size_bytes < 20000 * 1.3  # ~9.6 bits per URL at 1%
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_checkpointed_crawl_resumes_where_it_stopped(use_async, tmp_path, monkeypatch):
+    _patch_fetch(monkeypatch)
+    root = "https://example.com/sitemap.xml"
+    expected = extract_urls_recursive(root)
+    path = str(tmp_path / "crawl.sqlite3")
+
+    # Stop after the first batch; the checkpoint is written as the generator closes
+    with CrawlCheckpoint(path) as checkpoint:
+        if use_async:
+            async def first_batch():
+                batches = sitemap_parser.aiter_sitemap_batches(root, checkpoint=checkpoint, checkpoint_every=1)
+                batch = await batches.__anext__()
+                await batches.aclose()
+                return batch
+            first = asyncio.run(first_batch())
+        else:
+            batches = sitemap_parser.iter_sitemap_batches(root, checkpoint=checkpoint, checkpoint_every=1)
+            first = next(batches)
+            batches.close()
+        assert checkpoint.can_resume(root)
+        assert checkpoint.record_count() == len(first)
+
+    if use_async:
+        result = asyncio.run(sitemap_parser.resume_extract_urls_async(path, concurrency=3))
+    else:
+        result = sitemap_parser.resume_extract_urls(path)
+
+    assert result == expected
+    with CrawlCheckpoint(path) as checkpoint:
+        assert checkpoint.finished
+        assert not checkpoint.can_resume()
+
+
+RICH_URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+        xmlns:xhtml="http://www.w3.org/1999/xhtml"
+        xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"
+        xmlns:video="http://www.google.com/schemas/sitemap-video/1.1"
+        xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">
+  <url>
+    <loc>https://example.com/en</loc>
+    <lastmod>2024-05-01T10:30:00+02:00</lastmod>
+    <changefreq>Weekly</changefreq>
+    <priority>0.8</priority>
+    <xhtml:link rel="alternate" hreflang="de" href="https://example.com/de"/>
+    <xhtml:link rel="Alternate" hreflang="x-default" href="https://example.com/"/>
+    <image:image><image:loc>https://example.com/a.jpg</image:loc></image:image>
+    <image:image><image:loc>https://example.com/b.jpg</image:loc></image:image>
+    <video:video>
+      <video:title>Intro</video:title>
+      <video:content_loc>https://example.com/intro.mp4</video:content_loc>
+    </video:video>
+    <news:news>
+      <news:publication><news:name>Example Times</news:name><news:language>en</news:language></news:publication>
+      <news:publication_date>2024-05-01</news:publication_date>
+      <news:title>Launch</news:title>
+    </news:news>
+  </url>
+  <url><loc>https://example.com/plain</loc></url>
+  <url><loc>https://example.com/day</loc><lastmod>2024-05</lastmod><priority>high</priority></url>
+</urlset>"""
+
+
+def test_stream_parser_extracts_optional_url_fields():
+    body_parser = sitemap_parser.SitemapBodyParser()
+    for i in range(0, len(RICH_URLSET), 50):
+        body_parser.feed(RICH_URLSET[i:i + 50])
+    urls, _ = body_parser.close()
+
+    assert urls == ["https://example.com/en", "https://example.com/plain", "https://example.com/day"]
+    details = body_parser.url_details
+    assert "https://example.com/plain" not in details
+    assert details["https://example.com/en"] == {
+        "lastmod": "2024-05-01T10:30:00+02:00",
+        "changefreq": "Weekly",
+        "priority": "0.8",
+        "hreflang": [["de", "https://example.com/de"], ["x-default", "https://example.com/"]],
+        "images": ["https://example.com/a.jpg", "https://example.com/b.jpg"],
+        "videos": [{"title": "Intro", "content_loc": "https://example.com/intro.mp4"}],
+        "news": {"title": "Launch", "publication_date": "2024-05-01", "name": "Example Times", "language": "en"},
+    }
+
+
+def test_url_store_builds_typed_field_columns():
+    store = UrlStore()
+    store.extend(sitemap_parser.parse_uploaded_file(RICH_URLSET, "rich.xml"))
+    df = store.to_dataframe()
+
+    assert str(df["lastmod"].dtype) == "datetime64[ns, UTC]"
+    assert df["lastmod"][0] == pd.Timestamp("2024-05-01T08:30:00Z")
+    assert pd.isna(df["lastmod"][1])
+    assert df["lastmod"][2] == pd.Timestamp("2024-05-01T00:00:00Z")
+    assert df["priority"].dtype == np.float32
+    assert df["priority"][0] == np.float32(0.8)
+    assert np.isnan(df["priority"][2])
+    assert isinstance(df["changefreq"].dtype, pd.CategoricalDtype)
+    assert df["changefreq"].tolist()[0] == "weekly"
+    assert df["hreflang"][0] == "de=https://example.com/de x-default=https://example.com/"
+    assert df["images"][0] == "https://example.com/a.jpg https://example.com/b.jpg"
+    assert df["video_titles"][0] == "Intro"
+    assert df["news_name"][0] == "Example Times"
+    assert pd.isna(df["images"][1])
+
+    # URLs without optional fields add no empty columns
+    assert list(UrlStore().to_dataframe().columns) == ["sitemap_url", "source_sitemap"]
+
+
+def test_url_store_iterates_records_with_optional_fields():
+    store = UrlStore()
+    store.extend(sitemap_parser.parse_uploaded_file(RICH_URLSET, "rich.xml"))
+    records = list(store)
+
+    assert records[0] == {
+        "sitemap_url": "https://example.com/en",
+        "source_sitemap": "rich.xml",
+        "lastmod": "2024-05-01T08:30:00+00:00",
+        "changefreq": "weekly",
+        "priority": 0.8,
+        "hreflang": "de=https://example.com/de x-default=https://example.com/",
+        "images": "https://example.com/a.jpg https://example.com/b.jpg",
+        "video_urls": "https://example.com/intro.mp4",
+        "video_titles": "Intro",
+        "news_title": "Launch",
+        "news_publication_date": "2024-05-01",
+        "news_name": "Example Times",
+    }
+    assert records[1] == {"sitemap_url": "https://example.com/plain", "source_sitemap": "rich.xml"}
+    assert records[2]["lastmod"] == "2024-05-01T00:00:00+00:00"
+
+
+def test_parse_robots_sitemaps():
+    robots = (
+        "User-agent: *\n"
+        "Disallow: /private\n"
+        "Sitemap: https://example.com/sitemap.xml # main\n"
+        "sitemap:/news-sitemap.xml\n"
+        "SITEMAP: https://example.com/sitemap.xml\n"
+        "# Sitemap: https://example.com/commented.xml\n"
+    )
+    assert parse_robots_sitemaps(robots, "https://example.com") == [
+        "https://example.com/sitemap.xml", "https://example.com/news-sitemap.xml"
+    ]
+    assert site_root("example.com/some/page") == "https://example.com"
+
+
+def test_multi_root_crawl_shares_dedup(monkeypatch):
+    _patch_fetch(monkeypatch)
+    roots = ["https://example.com/a.xml", "https://example.com/nested.xml"]
+
+    expected = extract_urls_recursive(roots)
+    result = asyncio.run(extract_urls_recursive_async(roots, concurrency=3))
+
+    assert result == expected
+    all_urls, processed, errors = result
+    # /2 is in both roots' trees but reported once; a.xml is crawled once though nested.xml lists it
+    assert [u["sitemap_url"] for u in all_urls] == ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+    assert processed == ["https://example.com/a.xml", "https://example.com/nested.xml", "https://example.com/b.xml"]
+    assert errors == []
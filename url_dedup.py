@@ -0,0 +1,122 @@
+import hashlib
+import math
+import os
+import sqlite3
+import tempfile
+
+DEDUP_MODES = ("exact", "bloom", "disk")
+DEFAULT_ERROR_RATE = 0.001
+
+class ExactDedup:
+    """In-memory exact dedup (a plain set). Memory grows with every distinct URL."""
+
+    def __init__(self):
+        self._seen = set()
+
+    def add(self, url):
+        """Record a URL. Returns True if it had not been seen before."""
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        return True
+
+    def __len__(self):
+        return len(self._seen)
+
+    def close(self):
+        self._seen = set()
+
+class BloomDedup:
+    """
+    Probabilistic dedup backed by a Bloom filter sized for `capacity` URLs.
+
+    Memory is fixed up front (about 1.8 bytes per URL at a 0.1% error rate). A
+    false positive makes a new URL look like a duplicate, so up to roughly
+    `error_rate` of the URLs may be dropped once the filter is full; a URL is
+    never reported twice.
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def add(self, url):
+        """Record a URL. Returns True if it was (probably) not seen before."""
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        # Kirsch-Mitzenmacher: k positions from two 64-bit hashes
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        bits = self._bits
+        num_bits = self.num_bits
+        is_new = False
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % num_bits
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                is_new = True
+        if is_new:
+            self._count += 1
+        return is_new
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+    def close(self):
+        self._bits = bytearray()
+
+class DiskDedup:
+    """
+    Exact dedup backed by an SQLite table, so memory stays flat at any crawl size.
+
+    Without a `path` a temporary database is used and deleted on close().
+    """
+
+    def __init__(self, path=None):
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="sitemap-dedup-", suffix=".sqlite3")
+            os.close(fd)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Losing the dedup table on a crash is harmless; skip durability costs
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def add(self, url):
+        """Record a URL. Returns True if it had not been seen before."""
+        cursor = self._conn.execute("INSERT OR IGNORE INTO seen (url) VALUES (?)", (url,))
+        if cursor.rowcount == 1:
+            self._count += 1
+            return True
+        return False
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+        if self._owns_file and os.path.exists(self.path):
+            os.remove(self.path)
+
+def make_dedup(mode="exact", capacity=1000000, error_rate=DEFAULT_ERROR_RATE, path=None):
+    """Build a dedup backend by name: 'exact', 'bloom' (needs capacity) or 'disk'."""
+    if mode == "exact":
+        return ExactDedup()
+    if mode == "bloom":
+        return BloomDedup(capacity, error_rate)
+    if mode == "disk":
+        return DiskDedup(path)
+    raise ValueError(f"Unknown dedup mode: {mode!r} (expected one of {', '.join(DEDUP_MODES)})")
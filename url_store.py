@@ -0,0 +1,209 @@
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Valid <changefreq> values (sitemaps.org), in category order
+CHANGEFREQ_VALUES = ("always", "hourly", "daily", "weekly", "monthly", "yearly", "never")
+NAT = np.iinfo(np.int64).min # datetime64 NaT as int64
+# Sparse text columns built from the sitemap extensions, in DataFrame order
+EXTENSION_COLUMNS = (
+    "hreflang", "images", "video_urls", "video_titles", "news_title", "news_publication_date", "news_name",
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MAX_NS = 2 ** 63 - 1
+_CHANGEFREQ_CODES = {value: code for code, value in enumerate(CHANGEFREQ_VALUES)}
+
+def parse_lastmod(text):
+    """
+    Parse a W3C datetime (YYYY, YYYY-MM, YYYY-MM-DD or a full timestamp) into UTC
+    nanoseconds since the epoch. Naive times are taken as UTC; invalid values give NAT.
+    """
+    if not text:
+        return NAT
+    text = text.strip()
+    if len(text) == 4:
+        text += "-01-01"
+    elif len(text) == 7:
+        text += "-01"
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return NAT
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    ns = (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+    return ns if -_MAX_NS <= ns <= _MAX_NS else NAT # datetime64[ns] covers 1677-2262
+
+def _parse_priority(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def _extension_values(details):
+    """Flatten a record's hreflang/image/video/news fields into EXTENSION_COLUMNS text."""
+    values = {}
+    if details.get('hreflang'):
+        values['hreflang'] = " ".join(f"{lang}={href}" for lang, href in details['hreflang'])
+    if details.get('images'):
+        values['images'] = " ".join(details['images'])
+    videos = details.get('videos')
+    if videos:
+        video_urls = [v.get('content_loc') or v.get('player_loc') for v in videos]
+        if any(video_urls):
+            values['video_urls'] = " ".join(u for u in video_urls if u)
+        titles = [v['title'] for v in videos if v.get('title')]
+        if titles:
+            values['video_titles'] = " | ".join(titles)
+    news = details.get('news')
+    if news:
+        for key in ('title', 'publication_date', 'name'):
+            if news.get(key):
+                values['news_' + key] = news[key]
+    return values
+
+class UrlStore:
+    """
+    Compact, append-only columnar store for the crawlers' URL records.
+
+    URLs are kept UTF-8 encoded in one growing bytearray with an int64 offsets
+    array (the Arrow large_string layout), and each record's source sitemap is an
+    int32 code into a small table of distinct sitemap URLs. The optional sitemap
+    fields are typed columns: lastmod as int64 UTC nanoseconds, priority as float32
+    and changefreq as an int8 code. That is roughly the URL length plus 25 bytes per
+    record, instead of a dict and several str objects. The rarer extension fields
+    (hreflang, image, video, news) are flattened to text and stored sparsely.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('q', [0])
+        self._source_codes = array('i')
+        self._sources = [] # code -> source sitemap
+        self._source_index = {} # source sitemap -> code
+        self._lastmods = array('q') # ns since epoch, NAT if missing
+        self._priorities = array('f') # NaN if missing
+        self._changefreqs = array('b') # code into CHANGEFREQ_VALUES, -1 if missing
+        self._extensions = {} # column -> {row: text}
+
+    def __len__(self):
+        return len(self._source_codes)
+
+    def append(self, url, source_sitemap, details=None):
+        """Append one URL; `details` holds its optional sitemap fields (a crawl record works)."""
+        code = self._source_index.get(source_sitemap)
+        if code is None:
+            code = len(self._sources)
+            self._sources.append(source_sitemap)
+            self._source_index[source_sitemap] = code
+        row = len(self._source_codes)
+        self._data += url.encode('utf-8')
+        self._offsets.append(len(self._data))
+        self._source_codes.append(code)
+        if not details:
+            details = {}
+        self._lastmods.append(parse_lastmod(details.get('lastmod')))
+        self._priorities.append(_parse_priority(details.get('priority')))
+        changefreq = details.get('changefreq')
+        self._changefreqs.append(_CHANGEFREQ_CODES.get(changefreq.lower(), -1) if changefreq else -1)
+        for column, value in _extension_values(details).items():
+            self._extensions.setdefault(column, {})[row] = value
+
+    def extend(self, records):
+        """Append record dicts as produced by the sitemap crawlers."""
+        for record in records:
+            self.append(record['sitemap_url'], record['source_sitemap'], record)
+
+    def url(self, i):
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def urls(self):
+        """Iterate over the stored URLs (decoded one at a time)."""
+        for i in range(len(self)):
+            yield self.url(i)
+
+    def __iter__(self):
+        """
+        Iterate over records as dicts, for code that expects the list-of-dicts shape.
+
+        Optional fields are included only where a URL has them, normalized as in
+        to_dataframe: lastmod as a UTC ISO 8601 string, lowercase changefreq, float
+        priority and the flattened EXTENSION_COLUMNS text.
+        """
+        for i in range(len(self)):
+            record = {'sitemap_url': self.url(i), 'source_sitemap': self._sources[self._source_codes[i]]}
+            if self._lastmods[i] != NAT:
+                record['lastmod'] = pd.Timestamp(self._lastmods[i], tz='UTC').isoformat()
+            if self._changefreqs[i] >= 0:
+                record['changefreq'] = CHANGEFREQ_VALUES[self._changefreqs[i]]
+            if not np.isnan(self._priorities[i]):
+                record['priority'] = round(self._priorities[i], 6) # Undo float32 noise (0.800000011...)
+            for column in EXTENSION_COLUMNS:
+                values = self._extensions.get(column)
+                if values and i in values:
+                    record[column] = values[i]
+            yield record
+
+    def to_arrow(self):
+        """
+        Build a pyarrow Table (sitemap_url: large_string, source_sitemap: dictionary).
+
+        The URL bytes, offsets and source codes are wrapped, not copied, so the store
+        cannot grow while the table is alive (appending raises BufferError).
+        Requires the optional pyarrow dependency.
+        """
+        import pyarrow as pa
+
+        n = len(self)
+        urls = pa.Array.from_buffers(
+            pa.large_string(), n, [None, pa.py_buffer(self._offsets), pa.py_buffer(self._data)]
+        )
+        codes = pa.Array.from_buffers(pa.int32(), n, [None, pa.py_buffer(self._source_codes)])
+        sources = pa.DictionaryArray.from_arrays(codes, pa.array(self._sources, type=pa.string()))
+        return pa.table({'sitemap_url': urls, 'source_sitemap': sources})
+
+    def to_dataframe(self):
+        """
+        Build the app's DataFrame: sitemap_url strings plus a categorical source_sitemap.
+
+        With pyarrow installed the URL column is Arrow-backed and shares the store's
+        buffers (see to_arrow); without it URLs are decoded into Python strings once.
+        Optional field columns (lastmod as datetime64[ns, UTC], changefreq categorical,
+        priority float32, then EXTENSION_COLUMNS) are only added when some URL has them.
+        """
+        categories = pd.Index(self._sources, dtype=object)
+        codes = np.frombuffer(self._source_codes, dtype=np.int32) if len(self) else np.empty(0, dtype=np.int32)
+        source_col = pd.Categorical.from_codes(codes, categories=categories)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            url_col = pd.Series(list(self.urls()))
+        else:
+            url_col = pd.Series(pd.arrays.ArrowStringArray(self.to_arrow().column('sitemap_url')))
+        columns = {'sitemap_url': url_col, 'source_sitemap': source_col}
+        columns.update(self._field_columns())
+        return pd.DataFrame(columns)
+
+    def _field_columns(self):
+        n = len(self)
+        columns = {}
+        lastmods = np.array(self._lastmods, dtype=np.int64)
+        if (lastmods != NAT).any():
+            columns['lastmod'] = pd.Series(lastmods.view('datetime64[ns]')).dt.tz_localize('UTC')
+        changefreqs = np.array(self._changefreqs, dtype=np.int8)
+        if (changefreqs >= 0).any():
+            columns['changefreq'] = pd.Categorical.from_codes(changefreqs, categories=CHANGEFREQ_VALUES)
+        priorities = np.array(self._priorities, dtype=np.float32)
+        if not np.isnan(priorities).all():
+            columns['priority'] = priorities
+        for column in EXTENSION_COLUMNS:
+            values = self._extensions.get(column)
+            if values:
+                col = np.full(n, None, dtype=object)
+                col[list(values)] = list(values.values())
+                columns[column] = col
+        return columns